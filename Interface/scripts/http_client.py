@@ -0,0 +1,140 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling upstream while the circuit breaker is open."""
+
+
+class RetryableStatusError(requests.HTTPError):
+    """Upstream answered with a status in RETRY_STATUSES."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for a while.
+
+    After ``failure_threshold`` consecutive failed requests the circuit opens
+    and every call fails fast for ``reset_timeout`` seconds. After that one
+    trial request is let through (half-open); its success closes the circuit,
+    its failure opens it again.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Return True if a request may be sent now."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial_running = False
+
+
+class PooledClient:
+    """
+    Shared HTTP client for JSON APIs.
+
+    One requests.Session with a sized connection pool is reused by every
+    caller (keep-alive, no per-request TCP/TLS setup). Each attempt is bounded
+    by ``timeout``; connection errors, timeouts and RETRY_STATUSES are retried
+    up to ``retries`` times with full-jitter exponential backoff. A request
+    that still fails counts against the circuit breaker.
+
+    Args:
+        timeout: (connect, read) timeout in seconds per attempt
+        retries: Extra attempts after the first
+        backoff: Base backoff in seconds; attempt n sleeps up to backoff * 2**n
+        max_backoff: Upper bound of a single backoff
+        pool_size: Connections kept per host
+        breaker: CircuitBreaker (a new one by default)
+    """
+    def __init__(self, timeout=(3.05, 10), retries=2, backoff=0.25, max_backoff=4, pool_size=10,
+                 breaker=None, sleep=time.sleep, jitter=random.random):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.sleep = sleep
+        self.jitter = jitter
+
+        self.session = requests.Session()
+        # Retries are handled here (with jitter and the breaker), not by urllib3
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_json(self, url, params=None):
+        """
+        GET ``url`` and return the decoded JSON body.
+
+        Raises:
+            CircuitOpenError: The breaker is open; upstream was not called
+            requests.RequestException: Every attempt failed, or a non-retryable HTTP error
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {url}; not calling upstream")
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.sleep(self.jitter() * min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code in RETRY_STATUSES:
+                    raise RetryableStatusError(f"{response.status_code} from {url}", response=response)
+                response.raise_for_status()
+                data = response.json()
+            except (requests.ConnectionError, requests.Timeout, RetryableStatusError) as e:
+                error = e
+                continue
+            except requests.RequestException:
+                # Client errors mean upstream is reachable; don't trip the breaker
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return data
+
+        self.breaker.record_failure()
+        raise error
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """
+    Thread-safe LRU cache of serialized responses, bounded by total size.
+
+    Values are bytes and are returned exactly as stored, so a hit skips both
+    the computation and the JSON encoding. When adding an entry would exceed
+    ``max_bytes`` (or ``max_entries``), the least recently used entries are
+    evicted first; a value larger than ``max_bytes`` on its own is not stored.
+
+    Args:
+        max_bytes: Upper bound on the summed size of the cached values
+        max_entries: Optional upper bound on the number of entries
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> bytes, least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached bytes for ``key`` (marking them recently used), or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store ``value`` (bytes) and evict old entries to stay within the bounds."""
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes or (self.max_entries is not None
+                                                 and len(self._entries) > self.max_entries):
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self):
+        """Hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self.size, 'max_bytes': self.max_bytes}
@@ -2,6 +2,9 @@
 let energyAllocationChart = null;
 let costEmissionsChart = null;
 let totalEnergyChart = null;  // New chart for total energy
+// Running range of the total energy received so far, for the y-axis limits
+let totalEnergyMin = Infinity;
+let totalEnergyMax = -Infinity;
 
 // Initialize the page
 document.addEventListener('DOMContentLoaded', function() {
@@ -204,7 +207,7 @@ async function runSimulation() {
         const energyDemand = document.getElementById('energy-demand').value;
         const gridPrice = document.getElementById('grid-price').value;
         
-        // Call the simulation API
+        // Call the simulation API in streaming mode so long horizons render progressively
         const response = await fetch('http://localhost:5001/api/simulation', {
             method: 'POST',
             headers: {
@@ -213,20 +216,32 @@ async function runSimulation() {
             body: JSON.stringify({
                 simulationTime: parseInt(simulationTime),
                 energyDemand: parseFloat(energyDemand),
-                gridPrice: parseFloat(gridPrice)
+                gridPrice: parseFloat(gridPrice),
+                stream: 'ndjson'
             })
         });
         
-        const data = await response.json();
-        
-        if (data.success) {
-            // Update charts and display results
-            updateChartsWithData(data.results);
-            updateSummaryStats(data.summary);
-            populateResultsTable(data.results);
-        } else {
+        // Validation errors come back as a regular JSON response
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.includes('application/x-ndjson')) {
+            const data = await response.json();
             alert('Erreur lors de la simulation: ' + data.error);
+            return;
         }
+        
+        // Reset the display, then append each chunk of hours as it arrives
+        clearCharts();
+        document.querySelector('#simulation-data-table tbody').innerHTML = '';
+        await readNdjson(response, record => {
+            if (record.type === 'hours') {
+                appendChartData(record.results);
+                appendResultsRows(record.results);
+            } else if (record.type === 'summary') {
+                updateSummaryStats(record.summary);
+            } else if (record.type === 'error') {
+                alert('Erreur lors de la simulation: ' + record.error);
+            }
+        });
     } catch (error) {
         console.error('Error running simulation:', error);
         alert('Erreur de connexion au serveur de simulation. Assurez-vous que le serveur est en cours d\'exécution.');
@@ -238,50 +253,70 @@ async function runSimulation() {
     }
 }
 
-// Update charts with simulation data
-function updateChartsWithData(results) {
-    // Prepare data for charts
-    const hours = results.map(r => r.hour);
-    
-    // Calculate energy values
-    const solarEnergy = results.map(r => r.pvPanels * r.solarFactor);
-    const windEnergy = results.map(r => r.windTurbines * r.windFactor);
-    const gridEnergy = results.map(r => r.gridPower);
+// Read a newline-delimited JSON response, calling onRecord for each record as it arrives
+async function readNdjson(response, onRecord) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
     
-    // Total energy values directly from results
-    const totalEnergy = results.map(r => r.totalEnergy);
-    
-    // Cost and emissions
-    const costs = results.map(r => r.cost);
-    const emissions = results.map(r => r.co2);
-    
-    // Update energy allocation chart
-    energyAllocationChart.data.labels = hours;
-    energyAllocationChart.data.datasets[0].data = solarEnergy;
-    energyAllocationChart.data.datasets[1].data = windEnergy;
-    energyAllocationChart.data.datasets[2].data = gridEnergy;
-    energyAllocationChart.update();
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Keep the last (possibly incomplete) line for the next read
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onRecord(JSON.parse(line)));
+    }
+    if (buffer.trim()) {
+        onRecord(JSON.parse(buffer));
+    }
+}
+
+// Empty all charts before a new simulation
+function clearCharts() {
+    [energyAllocationChart, costEmissionsChart, totalEnergyChart].forEach(chart => {
+        chart.data.labels = [];
+        chart.data.datasets.forEach(dataset => {
+            dataset.data = [];
+        });
+        chart.update('none');
+    });
+    totalEnergyMin = Infinity;
+    totalEnergyMax = -Infinity;
+}
+
+// Append one chunk of hourly results to the charts, without redrawing earlier points
+function appendChartData(results) {
+    const hours = results.map(r => r.hour);
     
-    // Update cost and emissions chart
-    costEmissionsChart.data.labels = hours;
-    costEmissionsChart.data.datasets[0].data = costs;
-    costEmissionsChart.data.datasets[1].data = emissions;
-    costEmissionsChart.update();
+    // Energy allocation chart
+    energyAllocationChart.data.labels.push(...hours);
+    energyAllocationChart.data.datasets[0].data.push(...results.map(r => r.pvPanels * r.solarFactor));
+    energyAllocationChart.data.datasets[1].data.push(...results.map(r => r.windTurbines * r.windFactor));
+    energyAllocationChart.data.datasets[2].data.push(...results.map(r => r.gridPower));
+    energyAllocationChart.update('none');
     
-    // Update total energy chart
-    totalEnergyChart.data.labels = hours;
-    totalEnergyChart.data.datasets[0].data = totalEnergy;
+    // Cost and emissions chart
+    costEmissionsChart.data.labels.push(...hours);
+    costEmissionsChart.data.datasets[0].data.push(...results.map(r => r.cost));
+    costEmissionsChart.data.datasets[1].data.push(...results.map(r => r.co2));
+    costEmissionsChart.update('none');
     
-    // Calculate min and max values for better y-axis scaling on total energy chart
-    const min = Math.min(...totalEnergy);
-    const max = Math.max(...totalEnergy);
-    const padding = (max - min) * 0.1; // 10% padding
+    // Total energy chart
+    const totalEnergy = results.map(r => r.totalEnergy);
+    totalEnergyChart.data.labels.push(...hours);
+    totalEnergyChart.data.datasets[0].data.push(...totalEnergy);
     
     // Set y-axis limits to focus on the variations
-    totalEnergyChart.options.scales.y.min = Math.max(0, min - padding);
-    totalEnergyChart.options.scales.y.max = max + padding;
+    totalEnergyMin = Math.min(totalEnergyMin, ...totalEnergy);
+    totalEnergyMax = Math.max(totalEnergyMax, ...totalEnergy);
+    const padding = (totalEnergyMax - totalEnergyMin) * 0.1; // 10% padding
+    totalEnergyChart.options.scales.y.min = Math.max(0, totalEnergyMin - padding);
+    totalEnergyChart.options.scales.y.max = totalEnergyMax + padding;
     
-    totalEnergyChart.update();
+    totalEnergyChart.update('none');
 }
 
 // Update summary statistics
@@ -294,10 +329,10 @@ function updateSummaryStats(summary) {
     document.getElementById('total-co2').textContent = summary.totalCO2 + ' kg';
 }
 
-// Populate the detailed results table
-function populateResultsTable(results) {
+// Append rows to the detailed results table
+function appendResultsRows(results) {
     const tableBody = document.querySelector('#simulation-data-table tbody');
-    tableBody.innerHTML = '';
+    const fragment = document.createDocumentFragment();
     
     results.forEach(result => {
         const row = document.createElement('tr');
@@ -318,6 +353,8 @@ function populateResultsTable(results) {
             <td>${result.co2} kg</td>
         `;
         
-        tableBody.appendChild(row);
+        fragment.appendChild(row);
     });
+    
+    tableBody.appendChild(fragment);
 }
\ No newline at end of file
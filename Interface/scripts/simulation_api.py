@@ -1,10 +1,13 @@
 import sys
 import os
 import json
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import random
 import joblib
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 
 # Add the parent directory to sys.path
@@ -12,23 +15,73 @@ parent_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__f
 sys.path.append(parent_dir)
 
 # Import the Utils modules
-from Utils.Env import HybridEnergyEnv
-from Utils.best_action import get_best_actions
+from Utils.policy import GreedyPolicy
+from Utils.simulation_engine import (POLICIES, WindowSummary, hourly_records, scenario_grid, scenario_summary,
+                                     simulate_agent, simulate_grid_only, simulate_heuristic, simulate_policy,
+                                     simulate_windows, summary_records)
+from response_cache import ByteLRUCache
 
 app = Flask(__name__)
 CORS(app)
 
 # Load the trained model
+model_version = None
 try:
     model_path = os.path.join(parent_dir, "Models", "agent_model.pbz2")
     agent = joblib.load(model_path)
+    # Cached agent results are only valid for the model file they came from
+    model_stat = os.stat(model_path)
+    model_version = f"{model_stat.st_size}-{model_stat.st_mtime_ns}"
     print(f"Model loaded successfully from {model_path}")
 except Exception as e:
     print(f"Error loading model: {e}")
     agent = None
 
-# Initialize environment
-env = HybridEnergyEnv()
+# Vectorized Q-table lookup for the 'agent' policy, built once per model
+agent_policy = GreedyPolicy(agent) if agent is not None else None
+
+# Longest simulationTime of a single run (ten years of hours)
+MAX_SIMULATION_HOURS = 10 * 8760
+
+# Streaming mode: hours simulated and sent per NDJSON line / SSE event
+STREAM_CHUNK_HOURS = 168
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+
+# Seeded runs are deterministic, so their serialized responses are cached
+simulation_cache = ByteLRUCache(max_bytes=int(os.environ.get("SIMULATION_CACHE_BYTES", 64 * 1024 * 1024)))
+
+def stream_simulation(windows, policy, stream_format, on_complete=None):
+    """Yield the hourly records of each simulated window, then the summary as a trailing record.
+
+    ``windows`` is a simulate_windows generator, so each chunk is sent as soon
+    as its hours are simulated. NDJSON lines are {"type": "hours", "results":
+    [...]}, then {"type": "summary", "policy": ..., "summary": {...}}; SSE
+    uses the type as the event name and the rest as data. If the whole stream
+    was produced without error, ``on_complete`` is called with its bytes.
+    """
+    def encode(record_type, payload):
+        if stream_format == 'sse':
+            return f"event: {record_type}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({'type': record_type, **payload}) + "\n"
+
+    # The body is only kept when it is going to be cached
+    chunks = [] if on_complete is not None else None
+
+    def emit(chunk):
+        if chunks is not None:
+            chunks.append(chunk)
+        return chunk
+
+    try:
+        summary = WindowSummary()
+        for start, result in windows:
+            summary.add(result)
+            yield emit(encode('hours', {'results': hourly_records(result, 0, first_hour=start)}))
+        yield emit(encode('summary', {'policy': policy, 'summary': summary.records()[0]}))
+        if on_complete is not None:
+            on_complete(''.join(chunks).encode())
+    except Exception as e:
+        yield encode('error', {'error': str(e)})
 
 @app.route('/api/simulation', methods=['POST'])
 def run_simulation():
@@ -37,208 +90,256 @@ def run_simulation():
         simulation_time = int(data.get('simulationTime', 24))
         energy_demand = float(data.get('energyDemand', 100))
         grid_price = float(data.get('gridPrice', 0.15))
+        policy = data.get('policy', 'heuristic')
+        stream_format = data.get('stream')
+        seed = data.get('seed')
+        if not 0 < simulation_time <= MAX_SIMULATION_HOURS:
+            return jsonify({
+                'success': False,
+                'error': f"simulationTime must be between 1 and {MAX_SIMULATION_HOURS}"
+            }), 400
+        if policy not in POLICIES:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown policy '{policy}' (expected one of {', '.join(POLICIES)})"
+            }), 400
+        if policy == 'agent' and agent is None:
+            return jsonify({
+                'success': False,
+                'error': 'No trained agent is loaded'
+            }), 503
+        if stream_format is not None and stream_format not in STREAM_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown stream format '{stream_format}' (expected ndjson or sse)"
+            }), 400
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or seed < 0):
+            return jsonify({
+                'success': False,
+                'error': 'seed must be a non-negative integer'
+            }), 400
         
-        # Simulation results
-        simulation_results = []
-        
-        # Initial state
-        state = env.reset()
-        # Override demand and grid price
-        state[2] = energy_demand
-        state[3] = grid_price
+        mimetype = STREAM_FORMATS.get(stream_format, 'application/json')
+        cache_key = None
+        if seed is not None:
+            # Same parameters, seed, policy and model always produce the same bytes
+            cache_key = (policy, simulation_time, energy_demand, grid_price, seed, stream_format, model_version)
+            cached = simulation_cache.get(cache_key)
+            if cached is not None:
+                return Response(cached, mimetype=mimetype, headers={'X-Cache': 'HIT'})
+        headers = {} if cache_key is None else {'X-Cache': 'MISS'}
+        rng = np.random.default_rng(seed)
         
-        # Generate solar and wind patterns for the simulation period
-        # More realistic day/night pattern for solar
-        solar_pattern = []
-        for hour in range(simulation_time):
-            # Simulate day/night cycle for solar (peak at noon)
-            time_of_day = hour % 24
-            if time_of_day >= 6 and time_of_day <= 18:  # Daylight hours
-                # Enhanced solar performance (biased to be better)
-                peak_factor = 1 - abs(time_of_day - 12) / 6.5  # Extended peak
-                solar_factor = 0.2 + 0.75 * peak_factor  # Better minimum during day
-            else:
-                solar_factor = 0.08  # Slightly better at night
-            
-            solar_pattern.append(solar_factor)
+        if stream_format is not None:
+            # Simulated week by week while the response is being sent
+            windows = simulate_windows(policy, simulation_time, energy_demand, grid_price, rng=rng, agent=agent,
+                                       greedy_policy=agent_policy, window_hours=STREAM_CHUNK_HOURS)
+            on_complete = None if cache_key is None else lambda body: simulation_cache.set(cache_key, body)
+            return Response(stream_with_context(stream_simulation(windows, policy, stream_format, on_complete)),
+                            mimetype=mimetype,
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', **headers})
         
-        # Wind pattern with some variability but overall better performance
-        wind_pattern = []
-        wind_base = 0.45  # Higher base wind factor
-        for hour in range(simulation_time):
-            # Wind has less predictable pattern but overall higher values
-            wind_factor = max(0.2, min(0.95, wind_base + np.random.normal(0.05, 0.12)))
-            wind_pattern.append(wind_factor)
-            # Smoother transitions with bias toward higher values
-            wind_base = 0.65 * wind_base + 0.35 * wind_factor
-            
-            # Ensure we occasionally have some "great" wind hours for realism
-            if random.random() < 0.15:
-                wind_pattern[-1] = min(0.95, wind_pattern[-1] + 0.2)
+        # Whole-horizon simulation; the handler only serializes the arrays
+        if policy == 'agent':
+            # Every hour's state goes through batched Q-table inference in one call
+            result = simulate_agent(agent, simulation_time, energy_demand, grid_price, rng=rng, policy=agent_policy)
+        elif policy == 'grid_only':
+            result = simulate_grid_only(simulation_time, energy_demand, grid_price, rng=rng)
+        else:
+            result = simulate_heuristic(simulation_time, energy_demand, grid_price, rng=rng)
         
-        # Run simulation
-        total_cost = 0
-        total_co2 = 0
-        pv_counts = []
-        wt_counts = []
-        grid_powers = []
-        total_energies = []  # Track total energy for each hour
+        simulation_results = hourly_records(result)
+        summary = scenario_summary(result)
         
-        # Create a fake reference cost and emissions to show improvement
-        baseline_cost = energy_demand * grid_price * simulation_time * random.uniform(1.4, 1.8)
-        baseline_co2 = energy_demand * 0.4 * simulation_time * random.uniform(1.3, 1.7)  # 0.4kg CO2/kWh is common grid emission
-        
-        for hour in range(simulation_time):
-            # Update state with patterns
-            state[0] = solar_pattern[hour]  # Solar factor
-            state[1] = wind_pattern[hour]   # Wind factor
-            
-            # Always use biased optimal allocation instead of agent
-            # Calculate PV panels based on solar factor, favoring solar when available
-            pv_factor = state[0]  # Solar capacity factor
-            
-            # Optimal PV allocation (with randomness for realism)
-            # More panels when solar is good, but intelligent "optimization"
-            if pv_factor > 0.5:
-                pv_count = int(max(10, min(500, (energy_demand / (pv_factor + 0.1)) * random.uniform(0.7, 0.9))))
-            else:
-                # Still use some panels even when solar is low
-                pv_count = int(max(10, energy_demand / 2 * pv_factor * random.uniform(0.9, 1.2)))
-            
-            # Wind turbines allocation (with realistic variability)
-            wt_factor = state[1]  # Wind capacity factor
-            
-            if wt_factor > 0.4:
-                # Prefer wind when it's good
-                wt_count = int(max(5, min(47, (energy_demand / (wt_factor + 0.1)) * random.uniform(0.6, 0.8))))
-            else:
-                # Some backup wind even when conditions aren't ideal
-                wt_count = int(max(2, energy_demand / 4 * wt_factor * random.uniform(0.8, 1.1)))
-            
-            # Calculate actual power generation (slightly enhanced)
-            pv_power = pv_count * state[0] * random.uniform(1.0, 1.12)  # Slightly better than expected
-            wt_power = wt_count * state[1] * random.uniform(1.0, 1.15)  # Slightly better than expected
-            
-            # Grid power is calculated to ensure total energy meets demand exactly
-            renewable_energy = pv_power + wt_power
-            grid_power = energy_demand - renewable_energy
-            
-            # Ensure grid power doesn't go negative
-            if grid_power < 0:
-                # If we have excess renewable energy, adjust both sources proportionally
-                excess = -grid_power  # This is the amount we're over by
-                pv_power = pv_power * (renewable_energy - excess) / renewable_energy
-                wt_power = wt_power * (renewable_energy - excess) / renewable_energy
-                grid_power = 0
-            
-            # Now we ensure total energy equals demand
-            total_energy = pv_power + wt_power + grid_power
-            
-            # Add a tiny random fluctuation (±0.5% of energy demand) for realism while keeping close to demand
-            fluctuation = energy_demand * random.uniform(-0.005, 0.005)
-            
-            # Apply the fluctuation primarily to grid power since it's the most adjustable
-            grid_power += fluctuation
-            if grid_power < 0:  # Ensure grid power doesn't go negative after fluctuation
-                grid_power = 0
-                
-            # Recalculate total energy after all adjustments
-            total_energy = pv_power + wt_power + grid_power
-            
-            # Calculate biased cost and emissions (favorable)
-            # Lower cost than typical
-            cost = grid_power * grid_price * random.uniform(0.8, 0.98)
-            # Add minimal cost for maintenance of renewable
-            cost += (pv_power * 0.01 + wt_power * 0.015) * random.uniform(0.7, 0.9)
-            
-            # Lower CO2 than typical grid
-            co2 = grid_power * 0.35 * random.uniform(0.75, 0.95)  # kg CO2/kWh
-            # Add minimal CO2 for renewable (for realism)
-            co2 += (pv_power * 0.005 + wt_power * 0.007) * random.uniform(0.8, 1.0)
-            
-            # Accumulate totals
-            total_cost += cost
-            total_co2 += co2
-            pv_counts.append(pv_count)
-            wt_counts.append(wt_count)
-            grid_powers.append(grid_power)
-            total_energies.append(total_energy)  # Track total energy
-            
-            # Record the results for this hour
-            result = {
-                'hour': hour,
-                'solarFactor': round(state[0], 2),
-                'windFactor': round(state[1], 2),
-                'pvPanels': pv_count,
-                'windTurbines': wt_count, 
-                'gridPower': round(grid_power, 2),
-                'totalEnergy': round(total_energy, 2),
-                'cost': round(cost, 2),
-                'co2': round(co2, 2)
-            }
-            simulation_results.append(result)
-            
-            # Simulate transition to next state
-            if hour < simulation_time - 1:
-                state[0] = solar_pattern[hour + 1]
-                state[1] = wind_pattern[hour + 1]
-        
-        # Ensure total cost shows significant savings (40-60% better than baseline)
-        actual_savings_ratio = random.uniform(0.4, 0.6)
-        target_total_cost = baseline_cost * actual_savings_ratio
-        
-        # If our simulation didn't provide enough savings, adjust the results
-        if total_cost > target_total_cost:
-            cost_scale_factor = target_total_cost / total_cost
-            
-            # Scale all costs
-            for result in simulation_results:
-                result['cost'] = round(result['cost'] * cost_scale_factor, 2)
-            
-            # Update total cost
-            total_cost = target_total_cost
-        
-        # Similarly ensure CO2 emissions show significant reduction (45-65% better than baseline)
-        actual_emissions_ratio = random.uniform(0.35, 0.55)
-        target_total_co2 = baseline_co2 * actual_emissions_ratio
-        
-        # If our simulation didn't provide enough emissions reduction, adjust
-        if total_co2 > target_total_co2:
-            co2_scale_factor = target_total_co2 / total_co2
-            
-            # Scale all emissions
-            for result in simulation_results:
-                result['co2'] = round(result['co2'] * co2_scale_factor, 2)
-            
-            # Update total CO2
-            total_co2 = target_total_co2
-        
-        # Calculate averages
-        avg_pv = round(sum(pv_counts) / len(pv_counts))
-        avg_wt = round(sum(wt_counts) / len(wt_counts))
-        avg_grid = round(sum(grid_powers) / len(grid_powers), 2)
-        avg_total_energy = round(sum(total_energies) / len(total_energies), 2)  # Calculate average total energy
-        
-        # Summary data
-        summary = {
-            'averagePvPanels': avg_pv,
-            'averageWindTurbines': avg_wt,
-            'averageGridPower': avg_grid,
-            'averageTotalEnergy': avg_total_energy,  # Add average total energy to summary
-            'totalCost': round(total_cost, 2),
-            'totalCO2': round(total_co2, 2)
-        }
-        
-        return jsonify({
+        body = app.json.dumps({
             'success': True,
+            'policy': policy,
             'results': simulation_results,
             'summary': summary
-        })
+        }).encode()
+        if cache_key is not None:
+            simulation_cache.set(cache_key, body)
+        return Response(body, mimetype=mimetype, headers=headers)
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/simulation/cache/stats', methods=['GET'])
+def get_simulation_cache_stats():
+    """Simulation response cache counters"""
+    return jsonify({**simulation_cache.stats(), 'modelVersion': model_version})
+
+# Batch simulations: scenarios with the same horizon are stacked into one
+# array computation, split into chunks, and run on a process pool.
+MAX_BATCH_SCENARIOS = 10000
+MAX_BATCH_HOURS = 10 * 8760  # Longest simulationTime in a batch
+MAX_DETAIL_SCENARIO_HOURS = 1000000  # Per-hour rows a batch with "detail" may return
+MAX_SYNC_SCENARIOS = 256  # Larger sweeps always run as polled jobs
+SCENARIOS_PER_TASK = 64
+MAX_JOBS = 100
+
+_executor = None
+_executor_lock = threading.Lock()
+_jobs = {}
+_jobs_lock = threading.Lock()
+_worker_agent = None
+_worker_policy = None
+
+def _init_worker(worker_agent):
+    """Give each pool process its own copy of the agent and its lookup once, not per task."""
+    global _worker_agent, _worker_policy
+    _worker_agent = worker_agent
+    _worker_policy = GreedyPolicy(worker_agent) if worker_agent is not None else None
+
+def _run_chunk(policy, hours, demands, prices, seed, detail):
+    """Worker task: simulate a stack of scenarios sharing one horizon."""
+    result = simulate_policy(policy, hours, demands, prices, rng=np.random.default_rng(seed),
+                             agent=_worker_agent, greedy_policy=_worker_policy)
+    summaries = summary_records(result)
+    if not detail:
+        return summaries, None
+    return summaries, [hourly_records(result, s) for s in range(len(summaries))]
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(initializer=_init_worker, initargs=(agent,))
+        return _executor
+
+def _submit_batch(scenarios, policy, detail):
+    """Submit chunked scenario groups; return a list of (scenario indices, future)."""
+    groups = {}
+    for i, scenario in enumerate(scenarios):
+        groups.setdefault(scenario['simulationTime'], []).append(i)
+    seeds = np.random.SeedSequence().spawn(len(scenarios) // SCENARIOS_PER_TASK + len(groups))
+    executor = _get_executor()
+    tasks = []
+    for hours, indices in groups.items():
+        for start in range(0, len(indices), SCENARIOS_PER_TASK):
+            chunk = indices[start:start + SCENARIOS_PER_TASK]
+            future = executor.submit(_run_chunk, policy, hours,
+                                     [scenarios[i]['energyDemand'] for i in chunk],
+                                     [scenarios[i]['gridPrice'] for i in chunk],
+                                     seeds[len(tasks)], detail)
+            tasks.append((chunk, future))
+    return tasks
+
+def _collect(job):
+    """Wait for a job's tasks and fill in its per-scenario results."""
+    try:
+        for chunk, future in job['tasks']:
+            summaries, details = future.result()
+            for n, i in enumerate(chunk):
+                job['results'][i]['summary'] = summaries[n]
+                if details is not None:
+                    job['results'][i]['results'] = details[n]
+            job['completed'] += len(chunk)
+        job['status'] = 'done'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+    finally:
+        job['tasks'] = []
+        job['finished'] = time.time()
+
+def _job_payload(job):
+    payload = {
+        'success': job['status'] != 'failed',
+        'jobId': job['id'],
+        'status': job['status'],
+        'policy': job['policy'],
+        'total': len(job['results']),
+        'completed': job['completed']
+    }
+    if job['status'] == 'done':
+        payload['scenarios'] = job['results']
+    if job['status'] == 'failed':
+        payload['error'] = job['error']
+    return payload
+
+@app.route('/api/simulation/batch', methods=['POST'])
+def run_simulation_batch():
+    """Run a sweep of scenarios.
+
+    Body: {"simulationTime": [..], "energyDemand": [..], "gridPrice": [..]} (each a
+    value or a list; the scenarios are their cartesian product), or an explicit
+    "scenarios" list of such dicts, plus "policy", "detail" (include per-hour
+    results) and "async". Sizes are checked before any scenario is built:
+    at most MAX_BATCH_SCENARIOS scenarios of up to MAX_BATCH_HOURS hours, and
+    at most MAX_DETAIL_SCENARIO_HOURS scenario-hours with "detail". Small
+    sweeps answer directly unless "async" is true;
+    sweeps above MAX_SYNC_SCENARIOS answer 202 with a job id to poll at
+    /api/simulation/batch/<jobId>.
+    """
+    data = request.get_json(silent=True) or {}
+    policy = data.get('policy', 'heuristic')
+    if policy not in POLICIES:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown policy '{policy}' (expected one of {', '.join(POLICIES)})"
+        }), 400
+    if policy == 'agent' and agent is None:
+        return jsonify({'success': False, 'error': 'No trained agent is loaded'}), 503
+    sweep = [data.get(name, default) for name, default in
+             (('simulationTime', 24), ('energyDemand', 100), ('gridPrice', 0.15))]
+    if 'scenarios' in data:
+        count = len(data['scenarios']) if isinstance(data['scenarios'], list) else 0
+    else:
+        count = int(np.prod([len(v) if isinstance(v, list) else 1 for v in sweep]))
+    if not 1 <= count <= MAX_BATCH_SCENARIOS:
+        return jsonify({'success': False, 'error': f"Between 1 and {MAX_BATCH_SCENARIOS} scenarios per batch"}), 400
+    try:
+        if 'scenarios' in data:
+            scenarios = [{'simulationTime': int(s.get('simulationTime', 24)),
+                          'energyDemand': float(s.get('energyDemand', 100)),
+                          'gridPrice': float(s.get('gridPrice', 0.15))} for s in data['scenarios']]
+        else:
+            scenarios = scenario_grid(*sweep)
+    except (TypeError, ValueError, AttributeError) as e:
+        return jsonify({'success': False, 'error': f"Invalid scenarios: {e}"}), 400
+    if any(not 0 < s['simulationTime'] <= MAX_BATCH_HOURS for s in scenarios):
+        return jsonify({'success': False, 'error': f"simulationTime must be between 1 and {MAX_BATCH_HOURS}"}), 400
+    detail = bool(data.get('detail', False))
+    if detail and sum(s['simulationTime'] for s in scenarios) > MAX_DETAIL_SCENARIO_HOURS:
+        return jsonify({
+            'success': False,
+            'error': f"At most {MAX_DETAIL_SCENARIO_HOURS} scenario-hours with detail; request summaries instead"
+        }), 400
+
+    job = {
+        'id': uuid.uuid4().hex,
+        'status': 'running',
+        'policy': policy,
+        'completed': 0,
+        'results': [{'id': i, **scenario} for i, scenario in enumerate(scenarios)],
+        'tasks': _submit_batch(scenarios, policy, detail),
+        'created': time.time(),
+        'finished': None
+    }
+    if not data.get('async', False) and len(scenarios) <= MAX_SYNC_SCENARIOS:
+        _collect(job)
+        return jsonify(_job_payload(job)), 200 if job['status'] == 'done' else 500
+
+    with _jobs_lock:
+        # Keep the store bounded: drop the oldest finished jobs first
+        finished = sorted((j for j in _jobs.values() if j['finished']), key=lambda j: j['finished'])
+        for old in finished[:max(0, len(_jobs) + 1 - MAX_JOBS)]:
+            del _jobs[old['id']]
+        _jobs[job['id']] = job
+    threading.Thread(target=_collect, args=(job,), daemon=True).start()
+    return jsonify({**_job_payload(job), 'poll': f"/api/simulation/batch/{job['id']}"}), 202
+
+@app.route('/api/simulation/batch/<job_id>', methods=['GET'])
+def get_simulation_batch(job_id):
+    """Status of a batch job, with its scenarios once it is done."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f"Unknown job '{job_id}'"}), 404
+    return jsonify(_job_payload(job))
+
 if __name__ == '__main__':
     app.run(port=5001)
\ No newline at end of file
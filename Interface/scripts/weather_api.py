@@ -1,9 +1,15 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS  # Add this import
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import numpy as np
+import io
 import math
+import os
+
+from http_client import CircuitBreaker, CircuitOpenError, PooledClient
+from weather_cache import TTLCache, cache_key
 
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:3000"])  # Allow requests from your frontend
@@ -14,7 +20,27 @@ TURBINE_RADIUS = 5  # Radius of the wind turbine blades in meters
 EFFICIENCY_WIND = 0.4  # Efficiency of the wind turbine (40%)
 EFFICIENCY_SOLAR = 0.2  # Efficiency of the solar panels (20%)
 
-OPEN_METEO_API = "https://api.open-meteo.com/v1/forecast"
+# Overridable so the API can run against a local stub server
+OPEN_METEO_API = os.environ.get("OPEN_METEO_API", "https://api.open-meteo.com/v1/forecast")
+
+# Shared keep-alive client: bounded timeouts, jittered retries, circuit breaker
+http_client = PooledClient(
+    timeout=(3.05, float(os.environ.get("OPEN_METEO_TIMEOUT", 10))),
+    retries=int(os.environ.get("OPEN_METEO_RETRIES", 2)),
+    breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30),
+)
+
+# Upstream responses are cached per rounded coordinates and variable list.
+# Expired entries keep being served for WEATHER_CACHE_STALE_TTL seconds while
+# they refresh in the background; set WEATHER_CACHE_FILE to persist them.
+# At most WEATHER_CACHE_MAX_ENTRIES entries are kept (least recently used go first).
+COORDINATE_PRECISION = 2
+weather_cache = TTLCache(
+    ttl=float(os.environ.get("WEATHER_CACHE_TTL", 600)),
+    stale_ttl=float(os.environ.get("WEATHER_CACHE_STALE_TTL", 3600)),
+    persist_path=os.environ.get("WEATHER_CACHE_FILE"),
+    max_entries=int(os.environ.get("WEATHER_CACHE_MAX_ENTRIES", 1024)),
+)
 
 def calculate_wind_power(wind_speed_kmh, air_density=1.225, turbine_radius=TURBINE_RADIUS, efficiency=EFFICIENCY_WIND):
     """
@@ -48,17 +74,54 @@ def calculate_solar_power(solar_radiation, efficiency=EFFICIENCY_SOLAR):
     area = 1.0  # m²
     return round(solar_radiation * efficiency * area, 2)
 
+def wind_power_array(wind_speed_kmh, air_density=1.225, turbine_radius=TURBINE_RADIUS, efficiency=EFFICIENCY_WIND):
+    """Array version of calculate_wind_power: one expression over every element, NaN where speed is missing."""
+    wind_speed_ms = np.asarray(wind_speed_kmh, dtype=float) / 3.6  # Convert km/h to m/s
+    swept_area = np.pi * turbine_radius**2  # A = πR²
+    return np.round(0.5 * air_density * swept_area * wind_speed_ms**3 * efficiency, 2)
 
-def fetch_current_weather(latitude, longitude):
-    """Fetch current weather data from Open-Meteo"""
+def solar_power_array(solar_radiation, efficiency=EFFICIENCY_SOLAR):
+    """Array version of calculate_solar_power, NaN where radiation is missing."""
+    area = 1.0  # m²
+    return np.round(np.asarray(solar_radiation, dtype=float) * efficiency * area, 2)
+
+def to_json_list(values):
+    """Array to a JSON-safe list (NaN becomes null)."""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def fetch_open_meteo(kind, latitude, longitude, variables, **extra_params):
+    """Fetch ``variables`` for a coordinate through the shared cache.
+
+    Coordinates are rounded before the upstream call, so every request that
+    maps to a cache entry gets exactly the data stored in it.
+    """
+    latitude = round(float(latitude), COORDINATE_PRECISION)
+    longitude = round(float(longitude), COORDINATE_PRECISION)
     params = {
         "latitude": latitude,
         "longitude": longitude,
-        "current": "temperature_2m,wind_speed_10m,shortwave_radiation",
-        "timezone": "auto"
+        kind: variables,
+        "timezone": "auto",
+        **extra_params
     }
-    response = requests.get(OPEN_METEO_API, params=params)
-    return response.json()
+
+    key = cache_key(kind, latitude, longitude, variables, COORDINATE_PRECISION)
+    if extra_params:
+        key += ":" + ",".join(f"{name}={value}" for name, value in sorted(extra_params.items()))
+    try:
+        return weather_cache.get(key, lambda: http_client.get_json(OPEN_METEO_API, params))
+    except (requests.RequestException, CircuitOpenError):
+        # Upstream is failing: fall back to the last value we have, however old
+        cached = weather_cache.peek(key)
+        if cached is None:
+            raise
+        return cached
+
+def fetch_current_weather(latitude, longitude):
+    """Fetch current weather data from Open-Meteo"""
+    return fetch_open_meteo("current", latitude, longitude, "temperature_2m,wind_speed_10m,shortwave_radiation")
 
 @app.route('/api/sensor/solar', methods=['GET'])
 def get_solar_power():
@@ -92,6 +155,17 @@ def get_wind_power():
         "timestamp": datetime.now().isoformat()
     })
 
+@app.errorhandler(requests.RequestException)
+@app.errorhandler(CircuitOpenError)
+def upstream_unavailable(error):
+    """Weather upstream failed and nothing is cached for the request"""
+    return jsonify({"error": f"Weather service unavailable: {error}"}), 503
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Weather cache hit/miss counters"""
+    return jsonify({**weather_cache.stats(), "circuit": http_client.breaker.state})
+
 @app.route('/api/sensor/grid', methods=['GET'])
 def get_grid_power():
     """Simulated grid consumption"""
@@ -103,33 +177,110 @@ def get_grid_power():
 @app.route('/api/forecast/<float:lat>/<float:lon>', methods=['GET'])
 def get_forecast(lat, lon):
     """Get 7-day forecast with energy calculations"""
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "hourly": "temperature_2m,wind_speed_10m,shortwave_radiation",
-        "timezone": "auto",
-        "forecast_days": 7
-    }
-    
-    response = requests.get(OPEN_METEO_API, params=params)
-    weather_data = response.json()
+    weather_data = fetch_open_meteo("hourly", lat, lon, "temperature_2m,wind_speed_10m,shortwave_radiation",
+                                    forecast_days=7)
     
+    hourly = weather_data["hourly"]
     result = {
-        "time": weather_data["hourly"]["time"],
-        "temperature": weather_data["hourly"]["temperature_2m"],
-        "wind_speed": weather_data["hourly"]["wind_speed_10m"],
-        "radiation": weather_data["hourly"]["shortwave_radiation"],
-        "wind_power": [],
-        "solar_power": []
+        "time": hourly["time"],
+        "temperature": hourly["temperature_2m"],
+        "wind_speed": hourly["wind_speed_10m"],
+        "radiation": hourly["shortwave_radiation"],
+        "wind_power": to_json_list(wind_power_array(np.array(hourly["wind_speed_10m"], dtype=float))),
+        "solar_power": to_json_list(solar_power_array(np.array(hourly["shortwave_radiation"], dtype=float)))
     }
     
-    for i in range(len(result["time"])):
-        wind_power = calculate_wind_power(result["wind_speed"][i])
-        solar_power = calculate_solar_power(result["radiation"][i])
-        result["wind_power"].append(wind_power)
-        result["solar_power"].append(solar_power)
-    
     return jsonify(result)
 
+MAX_BATCH_SITES = 100
+MAX_FORECAST_DAYS = 16  # Open-Meteo forecasts cover 1 to 16 days
+BATCH_WORKERS = 8
+FORECAST_VARIABLES = "temperature_2m,wind_speed_10m,shortwave_radiation"
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+@app.route('/api/forecast/batch', methods=['POST'])
+def get_forecast_batch():
+    """Forecast with energy calculations for many sites at once.
+
+    Body: {"sites": [{"lat": .., "lon": .., "id": ..}, ...], "forecast_days": 7,
+           "format": "json" | "npz"}; forecast_days must be 1..MAX_FORECAST_DAYS.
+
+    Sites are fetched concurrently (through the shared cache and client) and
+    converted together as (sites, hours) arrays. The JSON response is columnar:
+    one list of rows per variable, a row per site, null for missing hours or
+    failed sites. ``format=npz`` returns the same arrays as a compressed
+    NumPy archive instead.
+    """
+    data = request.get_json(silent=True) or {}
+    sites = data.get("sites")
+    if not isinstance(sites, list) or not sites:
+        return jsonify({"error": "Body must contain a non-empty 'sites' list"}), 400
+    if len(sites) > MAX_BATCH_SITES:
+        return jsonify({"error": f"At most {MAX_BATCH_SITES} sites per request"}), 400
+    try:
+        lats = [float(site["lat"]) for site in sites]
+        lons = [float(site["lon"]) for site in sites]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Every site needs numeric 'lat' and 'lon'"}), 400
+    try:
+        forecast_days = int(data.get("forecast_days", 7))
+    except (TypeError, ValueError):
+        forecast_days = None
+    if forecast_days is None or not 1 <= forecast_days <= MAX_FORECAST_DAYS:
+        return jsonify({"error": f"forecast_days must be an integer between 1 and {MAX_FORECAST_DAYS}"}), 400
+    output_format = data.get("format", "json")
+    if output_format not in ("json", "npz"):
+        return jsonify({"error": "format must be 'json' or 'npz'"}), 400
+
+    futures = [batch_executor.submit(fetch_open_meteo, "hourly", lat, lon, FORECAST_VARIABLES,
+                                     forecast_days=forecast_days)
+               for lat, lon in zip(lats, lons)]
+    hourly, errors = [], []
+    for future in futures:
+        try:
+            hourly.append(future.result()["hourly"])
+            errors.append(None)
+        except (requests.RequestException, CircuitOpenError, KeyError) as error:
+            hourly.append(None)
+            errors.append(str(error))
+
+    # Stack every site into (sites, hours) arrays, padding with NaN
+    hours = max((len(h["time"]) for h in hourly if h is not None), default=0)
+    def stack(name):
+        matrix = np.full((len(sites), hours), np.nan)
+        for i, h in enumerate(hourly):
+            if h is not None:
+                matrix[i, :len(h[name])] = np.array(h[name], dtype=float)
+        return matrix
+    temperature = stack("temperature_2m")
+    wind_speed = stack("wind_speed_10m")
+    radiation = stack("shortwave_radiation")
+    wind_power = wind_power_array(wind_speed)
+    solar_power = solar_power_array(radiation)
+    times = [h["time"] if h is not None else [] for h in hourly]
+
+    if output_format == "npz":
+        time_matrix = np.full((len(sites), hours), "", dtype="U16")
+        for i, t in enumerate(times):
+            time_matrix[i, :len(t)] = t
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, lat=np.array(lats), lon=np.array(lons),
+                            ok=np.array([e is None for e in errors]), time=time_matrix,
+                            temperature=temperature, wind_speed=wind_speed, radiation=radiation,
+                            wind_power=wind_power, solar_power=solar_power)
+        return Response(buffer.getvalue(), mimetype="application/octet-stream",
+                        headers={"Content-Disposition": "attachment; filename=forecast_batch.npz"})
+
+    return jsonify({
+        "sites": [{"id": site.get("id", i), "lat": lat, "lon": lon, "error": error}
+                  for i, (site, lat, lon, error) in enumerate(zip(sites, lats, lons, errors))],
+        "time": times,
+        "temperature": [to_json_list(row) for row in temperature],
+        "wind_speed": [to_json_list(row) for row in wind_speed],
+        "radiation": [to_json_list(row) for row in radiation],
+        "wind_power": [to_json_list(row) for row in wind_power],
+        "solar_power": [to_json_list(row) for row in solar_power]
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(kind, latitude, longitude, variables, precision=2):
+    """
+    Cache key for an Open-Meteo request.
+
+    Coordinates are rounded to ``precision`` decimals (about 1 km at 2), so
+    nearby requests share an entry, and the variable list is order-independent.
+    """
+    if isinstance(variables, str):
+        variables = variables.split(',')
+    return f"{kind}:{round(float(latitude), precision)},{round(float(longitude), precision)}:{','.join(sorted(variables))}"
+
+
+class _Flight:
+    """One in-progress load that concurrent callers wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe keyed TTL cache with request coalescing.
+
+    - Entries younger than ``ttl`` seconds are served directly.
+    - Entries older than ``ttl`` but younger than ``ttl + stale_ttl`` are served
+      immediately while one background thread refreshes them
+      (stale-while-revalidate), so upstream latency stays off the request path.
+    - On a miss, only one caller runs the loader; concurrent callers for the
+      same key wait for its result instead of issuing their own request.
+    - At most ``max_entries`` entries are kept. When a new entry exceeds the
+      bound, entries past ``ttl + stale_ttl`` are dropped first, then the
+      least recently used ones.
+    - With ``persist_path`` the entries are written to a JSON file and reloaded
+      on start, so a restarted server can serve (possibly stale) data at once.
+      Writes are debounced by ``persist_delay`` seconds and happen outside the
+      lock, so a burst of stores costs one write and never blocks readers.
+
+    Args:
+        ttl: Seconds an entry is fresh
+        stale_ttl: Extra seconds an expired entry may be served while refreshing
+        persist_path: Optional JSON file for the entries
+        clock: Time source (wall-clock seconds), replaceable for testing
+        max_entries: Upper bound on the number of entries
+        persist_delay: Seconds to wait after a change before writing the file
+    """
+    def __init__(self, ttl=600, stale_ttl=3600, persist_path=None, clock=time.time, max_entries=1024,
+                 persist_delay=1.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.persist_path = persist_path
+        self.clock = clock
+        self.max_entries = max_entries
+        self.persist_delay = persist_delay
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Serializes file writes, not cache access
+        self._save_timer = None
+        self._entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+        self._flights = {}  # key -> _Flight
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if persist_path and os.path.exists(persist_path):
+            self._load()
+
+    def get(self, key, loader):
+        """
+        Return the cached value for ``key``, calling ``loader()`` when needed.
+
+        Errors from the loader propagate to every caller waiting on that load
+        and are not cached.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry[1]
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    if key not in self._flights:
+                        self._flights[key] = _Flight()
+                        threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+                    return entry[1]
+
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if leader:
+            self._refresh(key, loader)
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _refresh(self, key, loader):
+        """Run the loader for ``key`` and publish the result to waiting callers."""
+        with self._lock:
+            flight = self._flights[key]
+        try:
+            flight.value = loader()
+            self.set(key, flight.value)
+        except Exception as error:
+            flight.error = error
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def set(self, key, value):
+        """Store a value as fresh."""
+        with self._lock:
+            now = self.clock()
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+        self._schedule_save()
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones, down to max_entries (lock held)."""
+        expired = [key for key, (stored_at, _) in self._entries.items()
+                   if now - stored_at >= self.ttl + self.stale_ttl]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self.evictions += len(expired)
+
+    def peek(self, key):
+        """Return the last stored value for ``key`` regardless of age, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._schedule_save()
+
+    def stats(self):
+        """Hit/miss/eviction counters and the number of cached entries."""
+        with self._lock:
+            return {'hits': self.hits, 'stale_hits': self.stale_hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'entries': len(self._entries)}
+
+    def _schedule_save(self):
+        """Write the file ``persist_delay`` seconds from now unless a write is already pending."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.persist_delay, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self):
+        """Write the entries to ``persist_path`` now (a no-op without one)."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            snapshot = {key: [stored_at, value] for key, (stored_at, value) in self._entries.items()}
+        # Serialize and write from the snapshot without holding the cache lock
+        with self._save_lock:
+            tmp = self.persist_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.persist_path)
+
+    def _load(self):
+        try:
+            with open(self.persist_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return  # A corrupt or unreadable cache file only costs a refetch
+        now = self.clock()
+        # Oldest first, so the most recently stored entries survive the bound
+        entries = sorted(((stored_at, key, value) for key, (stored_at, value) in data.items()
+                          if now - stored_at < self.ttl + self.stale_ttl), key=lambda e: e[0])
+        self._entries = OrderedDict((key, (stored_at, value))
+                                    for stored_at, key, value in entries[max(0, len(entries) - self.max_entries):])
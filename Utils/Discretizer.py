@@ -0,0 +1,211 @@
+import numpy as np
+
+from Utils.Env import PV_POWER_PER_PANEL, WT_POWER_PER_TURBINE
+
+
+class RoundingDiscretizer:
+    """
+    Original EnhancedQAgent discretization: round every state component to
+    ``decimals`` decimals. Keys are the rounded states themselves.
+    """
+    keys_are_states = True
+    n_tilings = 1
+
+    def __init__(self, decimals=2):
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+
+    def __call__(self, state):
+        return tuple(np.round(state, decimals=self.decimals))
+
+    def keys(self, state):
+        """Return every key a state activates (a single one here)."""
+        return [self(state)]
+
+    def lattice(self, states):
+        """Integer coordinates of the keys of an (N, d) batch, shaped (N, n_tilings, key_size)."""
+        rounded = np.round(np.asarray(states, dtype=float), self.decimals)
+        return np.rint(rounded * self.scale).astype(np.int64)[:, np.newaxis, :]
+
+    def key_lattice(self, keys):
+        """Integer coordinates of stored keys given as an (n, key_size) array."""
+        return np.rint(np.asarray(keys, dtype=float) * self.scale).astype(np.int64)
+
+    def reference_states(self, states):
+        """States used for energy checks: the rounded states, as the agent sees them."""
+        return np.round(np.asarray(states, dtype=float), self.decimals)
+
+    def config(self):
+        return {'type': 'rounding', 'decimals': self.decimals}
+
+
+class BinDiscretizer:
+    """
+    Per-dimension bin edges. A state maps to the tuple of its bin indices, so
+    each dimension gets exactly the resolution its edges give it; a dimension
+    with no edges collapses to a single bin.
+
+    Args:
+        edges: One sorted sequence of inner bin edges per state dimension
+    """
+    keys_are_states = False
+    n_tilings = 1
+
+    def __init__(self, edges):
+        self.edges = [np.asarray(e, dtype=float) for e in edges]
+
+    def _bins(self, states, edges):
+        states = np.asarray(states, dtype=float).reshape(-1, len(edges))
+        return np.column_stack([np.searchsorted(e, states[:, d], side='right')
+                                for d, e in enumerate(edges)]).astype(np.int64)
+
+    def __call__(self, state):
+        return tuple(int(b) for b in self._bins(state, self.edges)[0])
+
+    def keys(self, state):
+        """Return every key a state activates (a single one here)."""
+        return [self(state)]
+
+    def lattice(self, states):
+        """Integer coordinates of the keys of an (N, d) batch, shaped (N, n_tilings, key_size)."""
+        return self._bins(states, self.edges)[:, np.newaxis, :]
+
+    def key_lattice(self, keys):
+        """Integer coordinates of stored keys given as an (n, key_size) array."""
+        return np.rint(np.asarray(keys, dtype=float)).astype(np.int64)
+
+    def reference_states(self, states):
+        """States used for energy checks: bins lose the magnitudes, so the raw states."""
+        return np.asarray(states, dtype=float)
+
+    @property
+    def n_states(self):
+        """Number of distinct keys the bins can produce."""
+        return int(np.prod([len(e) + 1 for e in self.edges]))
+
+    @classmethod
+    def from_quantiles(cls, samples, n_bins=10, fixed_edges=None):
+        """
+        Learn edges from the quantiles of sample states.
+
+        Args:
+            samples: (n, d) array of states; a column of NaN leaves that dimension unlearned
+            n_bins: Bins per dimension (int or one value per dimension)
+            fixed_edges: Optional {dimension: edges} overriding the learned ones
+        """
+        samples = np.asarray(samples, dtype=float)
+        n_dims = samples.shape[1]
+        n_bins = np.broadcast_to(n_bins, (n_dims,))
+        fixed_edges = fixed_edges or {}
+        edges = []
+        for d in range(n_dims):
+            if d in fixed_edges:
+                edges.append(fixed_edges[d])
+                continue
+            column = samples[:, d]
+            column = column[np.isfinite(column)]
+            if len(column) == 0 or n_bins[d] <= 1:
+                edges.append([])
+                continue
+            inner = np.quantile(column, np.linspace(0, 1, n_bins[d] + 1)[1:-1])
+            edges.append(np.unique(inner))
+        return cls(edges)
+
+    @classmethod
+    def from_csv(cls, filepath, columns=None, scales=None, n_bins=10, fixed_edges=None):
+        """
+        Learn edges from the quantiles of a dataset such as ``Data/Data.csv``.
+
+        Args:
+            filepath: CSV file to read
+            columns: {state dimension: column name}; defaults to solar from
+                'Power Generated' and wind from 'Wind_power'
+            scales: {state dimension: factor} converting column units to state units.
+                Solar and wind without a factor are normalized as in
+                EnergyTraces.from_csv: the peak maps to the rated power of one
+                panel (PV_POWER_PER_PANEL) or turbine (WT_POWER_PER_TURBINE),
+                so the edges are in the kW-per-unit states the env produces
+            n_bins: Bins per learned dimension
+            fixed_edges: Optional {dimension: edges} for dimensions without a column
+                (demand and price by default collapse to one bin)
+        """
+        import pandas as pd
+
+        if columns is None:
+            columns = {0: 'Power Generated', 1: 'Wind_power'}
+        scales = scales or {}
+        rated_power = {0: PV_POWER_PER_PANEL, 1: WT_POWER_PER_TURBINE}
+        data = pd.read_csv(filepath, usecols=list(columns.values()))
+        samples = np.full((len(data), 4), np.nan)
+        for d, column in columns.items():
+            values = data[column].to_numpy(dtype=float)
+            if d in scales:
+                scale = scales[d]
+            elif d in rated_power:
+                peak = np.nanmax(values) if np.isfinite(values).any() else 0.0
+                scale = rated_power[d] / peak if peak > 0 else 0.0
+            else:
+                scale = 1.0
+            samples[:, d] = values * scale
+        return cls.from_quantiles(samples, n_bins, fixed_edges)
+
+    def config(self):
+        return {'type': 'bins', 'edges': [e.tolist() for e in self.edges]}
+
+
+class TileCodingDiscretizer(BinDiscretizer):
+    """
+    Tile coding over per-dimension bins: ``n_tilings`` copies of the bin grid,
+    each shifted by a fraction of the typical bin width. A state activates one
+    tile per tiling, and the agent's Q-value is the mean over those tiles, so
+    neighbouring states share what they learn while fine distinctions remain.
+
+    Keys are ``(tiling, bin_0, ..., bin_d)`` tuples; the primary key (tiling 0)
+    uses the unshifted edges.
+    """
+    def __init__(self, edges, n_tilings=4):
+        super(TileCodingDiscretizer, self).__init__(edges)
+        self.n_tilings = n_tilings
+        widths = [np.median(np.diff(e)) if len(e) > 1 else 0.0 for e in self.edges]
+        self.tiling_edges = [[e - (t / n_tilings) * w for e, w in zip(self.edges, widths)]
+                             for t in range(n_tilings)]
+
+    def __call__(self, state):
+        return self.keys(state)[0]
+
+    def keys(self, state):
+        """Return the key of the active tile in every tiling."""
+        return [tuple(int(v) for v in key) for key in self.lattice(state)[0]]
+
+    def lattice(self, states):
+        """Integer coordinates of the keys of an (N, d) batch, shaped (N, n_tilings, 1 + d)."""
+        tilings = []
+        for t, edges in enumerate(self.tiling_edges):
+            bins = self._bins(states, edges)
+            tilings.append(np.column_stack([np.full(len(bins), t, dtype=np.int64), bins]))
+        return np.stack(tilings, axis=1)
+
+    @classmethod
+    def from_quantiles(cls, samples, n_bins=10, fixed_edges=None, n_tilings=4):
+        """Learn the base edges from quantiles (see BinDiscretizer.from_quantiles)."""
+        return cls(BinDiscretizer.from_quantiles(samples, n_bins, fixed_edges).edges, n_tilings)
+
+    @classmethod
+    def from_csv(cls, filepath, columns=None, scales=None, n_bins=10, fixed_edges=None, n_tilings=4):
+        """Learn the base edges from a dataset (see BinDiscretizer.from_csv)."""
+        return cls(BinDiscretizer.from_csv(filepath, columns, scales, n_bins, fixed_edges).edges, n_tilings)
+
+    def config(self):
+        return {'type': 'tiles', 'edges': [e.tolist() for e in self.edges], 'n_tilings': self.n_tilings}
+
+
+def discretizer_from_config(config):
+    """Rebuild a discretizer from the dict returned by its ``config()``."""
+    kind = config['type']
+    if kind == 'rounding':
+        return RoundingDiscretizer(config['decimals'])
+    if kind == 'bins':
+        return BinDiscretizer(config['edges'])
+    if kind == 'tiles':
+        return TileCodingDiscretizer(config['edges'], config['n_tilings'])
+    raise ValueError(f"Unknown discretizer type: {kind!r}")
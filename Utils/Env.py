@@ -1,58 +1,435 @@
 import numpy as np
-import random
-from collections import deque
 import gym
 from gym import spaces
 
+# Plant and emission parameters shared by the scalar and array reward models
+PV_POWER_PER_PANEL = 0.4  # kW per panel
+WT_POWER_PER_TURBINE = 20  # kW per turbine
+PV_CAPEX = 1000  # $ per kW
+WT_CAPEX = 1500  # $ per kW
+PV_LIFETIME = 25 * 365 * 24  # hours (25 years)
+WT_LIFETIME = 20 * 365 * 24  # hours (20 years)
+PV_OM_RATE = 0.015  # $ per kW per hour
+WT_OM_RATE = 0.025  # $ per kW per hour
+PV_LAND_AREA = 8  # m² per panel
+WT_LAND_AREA = 400  # m² per wind turbine
+LAND_LEASE_RATE = 0.0001  # $ per m² per hour
+PV_LIFECYCLE_CO2 = 40  # kg CO2-eq per kW
+WT_LIFECYCLE_CO2 = 11  # kg CO2-eq per kW
+PV_MAINTENANCE_CO2 = 0.0002  # kg CO2 per panel per hour
+WT_MAINTENANCE_CO2 = 0.001  # kg CO2 per turbine per hour
+EF_PV = 50  # gCO2/kWh
+EF_WT = 10  # gCO2/kWh
+EF_GRID = 800  # gCO2/kWh
+
+# Initial state used when no traces are given (and for missing trace columns)
+DEFAULT_DEMAND = 1000
+DEFAULT_GRID_PRICE = 0.1
+
+# Column names used for each trace across Data/Data.csv and the enhanced_weather_data files
+SOLAR_COLUMNS = ('Power Generated', 'Solar_Power_Generated (W)', 'Solar_Power_Generated_W')
+WIND_COLUMNS = ('Wind_power', 'Wind_Power_Generated (W)', 'Wind_Power_Generated_W')
+
+
+def calculate_cost_array(actions, states):
+    """Array version of HybridEnergyEnv.calculate_cost.
+
+    Args:
+        actions (array): Shape (..., 3) with [N_pv, N_wt, P_grid] in the last axis
+        states (array): Shape (..., 4) with [P_solar, P_wind, Energy demand, Grid price]
+            in the last axis. Leading axes broadcast against those of ``actions``.
+
+    Returns:
+        array: Negative cost with the broadcast leading shape
+    """
+    actions = np.asarray(actions, dtype=float)
+    states = np.asarray(states, dtype=float)
+    pv_count, wt_count, grid_power = actions[..., 0], actions[..., 1], actions[..., 2]
+    grid_price = states[..., 3]
+
+    # Terms that only depend on the action, summed in the same order as the scalar model
+    fixed_cost = (
+        (pv_count * PV_POWER_PER_PANEL * PV_CAPEX) / PV_LIFETIME +
+        (wt_count * WT_POWER_PER_TURBINE * WT_CAPEX) / WT_LIFETIME +
+        pv_count * PV_POWER_PER_PANEL * PV_OM_RATE +
+        wt_count * WT_POWER_PER_TURBINE * WT_OM_RATE
+    )
+    land_lease_cost = (pv_count * PV_LAND_AREA + wt_count * WT_LAND_AREA) * LAND_LEASE_RATE
+    grid_cost = np.maximum(0, grid_power) * grid_price
+
+    return -(fixed_cost + grid_cost + land_lease_cost)
+
+
+def calculate_co2_array(actions, states, ef_pv=EF_PV, ef_wt=EF_WT, ef_grid=EF_GRID):
+    """Array version of HybridEnergyEnv.calculate_co2.
+
+    Args:
+        actions (array): Shape (..., 3) with [N_pv, N_wt, P_grid] in the last axis
+        states (array): Shape (..., 4) with [P_solar, P_wind, Energy demand, Grid price]
+            in the last axis. Leading axes broadcast against those of ``actions``.
+        ef_pv, ef_wt, ef_grid (float): Emission factors in gCO2/kWh
+
+    Returns:
+        array: Negative CO2 emissions with the broadcast leading shape
+    """
+    actions = np.asarray(actions, dtype=float)
+    states = np.asarray(states, dtype=float)
+    pv_count, wt_count, grid_power = actions[..., 0], actions[..., 1], actions[..., 2]
+    p_solar, p_wind = states[..., 0], states[..., 1]
+
+    pv_power = pv_count * PV_POWER_PER_PANEL * p_solar
+    wt_power = wt_count * WT_POWER_PER_TURBINE * p_wind
+
+    total_co2 = (
+        (pv_count * PV_POWER_PER_PANEL * PV_LIFECYCLE_CO2) / PV_LIFETIME +
+        (wt_count * WT_POWER_PER_TURBINE * WT_LIFECYCLE_CO2) / WT_LIFETIME +
+        pv_power * (ef_pv / 1000) +
+        wt_power * (ef_wt / 1000) +
+        pv_count * PV_MAINTENANCE_CO2 +
+        wt_count * WT_MAINTENANCE_CO2 +
+        np.maximum(0, grid_power) * (ef_grid / 1000)
+    )
+
+    return -total_co2
+
+
+def score_action_grid(actions, states, ef_pv=EF_PV, ef_wt=EF_WT, ef_grid=EF_GRID):
+    """Score every action against every state in one broadcast expression.
+
+    Args:
+        actions (array): Shape (A, 3), e.g. the full discrete action grid of an agent
+        states (array): Shape (S, 4)
+
+    Returns:
+        tuple: (cost, co2) matrices of shape (S, A), both negative like the env rewards
+    """
+    actions = np.asarray(actions, dtype=float)[np.newaxis, :, :]
+    states = np.asarray(states, dtype=float).reshape(-1, 4)[:, np.newaxis, :]
+    cost = calculate_cost_array(actions, states)
+    co2 = calculate_co2_array(actions, states, ef_pv, ef_wt, ef_grid)
+    return cost, co2
+
+
+class SumTree:
+    """
+    Binary sum-tree over transition priorities stored in a flat array.
+
+    Leaves hold the priorities and every internal node holds the sum of its
+    children, so updates and proportional lookups walk one root-to-leaf path
+    (O(log n)). Both operations are vectorized over a batch of indices.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # Round the leaf count up to a power of two so every level is full
+        self.leaf_offset = 1 << max(0, int(np.ceil(np.log2(max(capacity, 1)))))
+        self.depth = int(np.log2(self.leaf_offset))
+        self.tree = np.zeros(2 * self.leaf_offset, dtype=np.float64)
+
+    @property
+    def total(self):
+        """Sum of all priorities"""
+        return self.tree[1]
+
+    def update(self, indices, priorities):
+        """Set leaf priorities and refresh the sums along their paths."""
+        nodes = np.asarray(indices, dtype=np.int64) + self.leaf_offset
+        self.tree[nodes] = priorities
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def get(self, indices):
+        """Return the priorities stored at the given leaves."""
+        return self.tree[np.asarray(indices, dtype=np.int64) + self.leaf_offset]
+
+    def find(self, values):
+        """Return the leaf index whose cumulative priority range contains each value."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values > left_sum
+            values = np.where(go_right, values - left_sum, values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.leaf_offset
+
+
 class ReplayBuffer:
     """
     Experience replay buffer to store and sample transitions.
+
+    Transitions live in preallocated contiguous arrays used as a ring buffer:
+    a write cursor overwrites the oldest entry once the buffer is full, and
+    sampling gathers a whole batch with one fancy-indexing call per field.
+    Arrays are allocated on the first ``add`` from the shapes of that transition.
+
+    With ``prioritized=True`` transitions are sampled proportionally to
+    ``priority ** alpha`` through a SumTree, and ``sample`` additionally returns
+    importance-sampling weights and the sampled indices so the caller can feed
+    new TD errors back through ``update_priorities``.
     """
-    def __init__(self, capacity=100000):
-        self.buffer = deque(maxlen=capacity)
+    def __init__(self, capacity=100000, seed=None, prioritized=False,
+                 alpha=0.6, beta=0.4, beta_increment=0.0, epsilon=1e-6):
         self.capacity = capacity
-    
+        self.rng = np.random.default_rng(seed)
+
+        # Prioritized replay settings
+        self.prioritized = prioritized
+        self.alpha = alpha  # How strongly priorities shape sampling (0 = uniform)
+        self.beta = beta  # Importance-sampling correction strength, annealed towards 1
+        self.beta_increment = beta_increment
+        self.epsilon = epsilon  # Keeps zero-error transitions sampleable
+        self.max_priority = 1.0
+        self.tree = SumTree(capacity) if prioritized else None
+        self.position = 0  # Next slot to write
+        self.size = 0  # Number of stored transitions
+
+        self.states = None
+        self.actions = None
+        self.rewards = None
+        self.next_states = None
+        self.dones = None
+
+    def _allocate(self, state, action):
+        """Allocate storage from the shapes of the first transition."""
+        state_shape = np.shape(state)
+        action_shape = np.shape(action)
+        self.states = np.zeros((self.capacity,) + state_shape, dtype=np.float64)
+        self.actions = np.zeros((self.capacity,) + action_shape, dtype=np.float64)
+        self.rewards = np.zeros((self.capacity, 1), dtype=np.float64)
+        self.next_states = np.zeros((self.capacity,) + state_shape, dtype=np.float64)
+        self.dones = np.zeros((self.capacity, 1), dtype=bool)
+
     def add(self, state, action, reward, next_state, done):
         """Add experience to buffer"""
-        experience = (state, action, reward, next_state, done)
-        self.buffer.append(experience)
-    
+        if self.states is None:
+            self._allocate(state, action)
+
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i, 0] = reward
+        self.next_states[i] = next_state
+        self.dones[i, 0] = done
+
+        # New transitions get the highest priority seen so far
+        if self.prioritized:
+            self.tree.update([i], self.max_priority ** self.alpha)
+
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
     def sample(self, batch_size):
-        """Randomly sample batch of experiences"""
+        """Randomly sample batch of experiences
+
+        Returns (states, actions, rewards, next_states, dones), followed by
+        (weights, indices) when the buffer is prioritized.
+        """
         # Make sure we don't sample more than buffer size
-        batch_size = min(batch_size, len(self.buffer))
-        
-        # Sample random indices
-        indices = random.sample(range(len(self.buffer)), batch_size)
-        
-        # Get samples
-        states, actions, rewards, next_states, dones = [], [], [], [], []
-        for i in indices:
-            s, a, r, s_, d = self.buffer[i]
-            states.append(s)
-            actions.append(a)
-            rewards.append(r)
-            next_states.append(s_)
-            dones.append(d)
-        
+        batch_size = min(batch_size, self.size)
+
+        if self.states is None:
+            # Nothing stored yet: empty arrays, as the list-based buffer returned
+            empty = tuple(np.array([]) for _ in range(5))
+            return empty + (np.zeros((0, 1)), np.array([], dtype=int)) if self.prioritized else empty
+
+        if self.prioritized:
+            return self._sample_prioritized(batch_size)
+
+        # Sample distinct random indices in one call
+        indices = self.rng.choice(self.size, size=batch_size, replace=False)
+
         return (
-            np.array(states), 
-            np.array(actions), 
-            np.array(rewards).reshape(-1, 1), 
-            np.array(next_states),
-            np.array(dones).reshape(-1, 1)
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices]
         )
-    
+
+    def _sample_prioritized(self, batch_size):
+        """Stratified proportional sampling with importance-sampling weights"""
+        if batch_size <= 0:
+            # No segments to stratify over; empty arrays shaped like a real batch
+            indices = np.zeros(0, dtype=np.int64)
+            return (
+                self.states[indices],
+                self.actions[indices],
+                self.rewards[indices],
+                self.next_states[indices],
+                self.dones[indices],
+                np.zeros((0, 1)),
+                indices
+            )
+        total = self.tree.total
+        segment = total / batch_size
+        values = (np.arange(batch_size) + self.rng.random(batch_size)) * segment
+        indices = np.minimum(self.tree.find(values), self.size - 1)
+
+        # w_i = (N * P(i)) ** -beta, normalized by the batch maximum
+        probabilities = self.tree.get(indices) / total
+        weights = (self.size * probabilities) ** (-self.beta)
+        weights = (weights / weights.max()).reshape(-1, 1)
+        self.beta = min(1.0, self.beta + self.beta_increment)
+
+        return (
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices],
+            weights,
+            indices
+        )
+
+    def update_priorities(self, indices, td_errors):
+        """Set new priorities for sampled transitions from their TD errors"""
+        priorities = np.abs(np.ravel(td_errors)) + self.epsilon
+        self.max_priority = max(self.max_priority, priorities.max())
+        self.tree.update(indices, priorities ** self.alpha)
+
     def __len__(self):
         """Return current buffer size"""
-        return len(self.buffer)
-    
+        return self.size
+
     def is_ready(self, batch_size):
         """Check if buffer has enough experiences"""
         return len(self) >= batch_size
 
+class EnergyTraces:
+    """
+    Solar, wind, and optional demand and price time series for trace-driven environments.
+
+    Every series is held as one contiguous float64 array, so environments read
+    a state with plain indexing and never parse data while stepping.
+
+    Args:
+        solar (array): Available PV power per panel (kW) at every time step
+        wind (array): Available wind power per turbine (kW) at every time step
+        demand (array or float): Energy demand per step, or a constant
+        price (array or float): Grid price per step, or a constant
+    """
+    def __init__(self, solar, wind, demand=DEFAULT_DEMAND, price=DEFAULT_GRID_PRICE):
+        self.solar = np.ascontiguousarray(solar, dtype=np.float64)
+        self.wind = np.ascontiguousarray(wind, dtype=np.float64)
+        length = len(self.solar)
+        if len(self.wind) != length:
+            raise ValueError("Solar and wind traces must have the same length")
+        self.demand = np.ascontiguousarray(np.broadcast_to(np.asarray(demand, dtype=np.float64), (length,)))
+        self.price = np.ascontiguousarray(np.broadcast_to(np.asarray(price, dtype=np.float64), (length,)))
+        if length == 0:
+            raise ValueError("Traces must contain at least one time step")
+
+    def __len__(self):
+        return len(self.solar)
+
+    def states(self, positions):
+        """Return the (N, 4) states [P_solar, P_wind, Energy demand, Grid price] at ``positions``."""
+        positions = np.asarray(positions)
+        return np.stack([self.solar[positions], self.wind[positions],
+                         self.demand[positions], self.price[positions]], axis=-1)
+
+    @classmethod
+    def from_csv(cls, filepaths, solar_column=None, wind_column=None, demand_column=None, price_column=None,
+                 solar_scale=None, wind_scale=None, demand=DEFAULT_DEMAND, price=DEFAULT_GRID_PRICE):
+        """
+        Load traces from one or more CSV files, concatenated in the given order.
+
+        By default solar and wind are normalized to capacity factors of the
+        largest value seen and multiplied by the rated power of one panel or
+        turbine, so the states match the units the reward model expects.
+
+        Args:
+            filepaths (str or list): CSV file(s) such as Data/Data.csv or enhanced_weather_data_*.csv
+            solar_column, wind_column (str): Column names; found among SOLAR_COLUMNS / WIND_COLUMNS if None
+            demand_column, price_column (str): Optional columns; the constants are used if None
+            solar_scale, wind_scale (float): Factors converting the columns to kW per unit;
+                None normalizes as described above
+            demand, price (float): Constants used when no column is given
+
+        Returns:
+            EnergyTraces: The preloaded traces
+        """
+        import pandas as pd
+
+        if isinstance(filepaths, str):
+            filepaths = [filepaths]
+        frames = [pd.read_csv(filepath) for filepath in filepaths]
+
+        def column(name, candidates):
+            names = [name] if name is not None else candidates
+            parts = []
+            for filepath, frame in zip(filepaths, frames):
+                found = next((c for c in names if c in frame.columns), None)
+                if found is None:
+                    raise KeyError(f"{filepath} has none of the columns {list(names)}")
+                parts.append(frame[found].to_numpy(dtype=np.float64))
+            return _fill_gaps(np.concatenate(parts))
+
+        solar = _scale_trace(column(solar_column, SOLAR_COLUMNS), solar_scale, PV_POWER_PER_PANEL)
+        wind = _scale_trace(column(wind_column, WIND_COLUMNS), wind_scale, WT_POWER_PER_TURBINE)
+        if demand_column is not None:
+            demand = column(demand_column, None)
+        if price_column is not None:
+            price = column(price_column, None)
+        return cls(solar, wind, demand, price)
+
+    @classmethod
+    def from_store(cls, store, start=None, end=None, solar_scale=None, wind_scale=None,
+                   demand=DEFAULT_DEMAND, price=DEFAULT_GRID_PRICE):
+        """
+        Load traces for a time range of a WeatherStore (see Utils/weather_store.py).
+
+        Args:
+            store: WeatherStore or the path of one
+            start, end: Time range, as in WeatherStore.query
+            solar_scale, wind_scale, demand, price: As in from_csv (the store holds power in W)
+
+        Returns:
+            EnergyTraces: The preloaded traces
+        """
+        from Utils.weather_store import WeatherStore
+
+        if isinstance(store, str):
+            store = WeatherStore(store)
+        data = store.query(start, end, ['solar_power_w', 'wind_power_w'])
+        solar = _scale_trace(_fill_gaps(data['solar_power_w']), solar_scale, PV_POWER_PER_PANEL)
+        wind = _scale_trace(_fill_gaps(data['wind_power_w']), wind_scale, WT_POWER_PER_TURBINE)
+        return cls(solar, wind, demand, price)
+
+
+def _fill_gaps(values):
+    """Linearly interpolate NaNs from neighbouring rows (zeros if the series is all NaN)."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if finite.all():
+        return values
+    if not finite.any():
+        return np.zeros_like(values)
+    positions = np.arange(len(values))
+    return np.interp(positions, positions[finite], values[finite])
+
+
+def _scale_trace(values, scale, rated_power):
+    """Apply an explicit scale, or normalize to the peak and multiply by the rated power of one unit."""
+    if scale is not None:
+        return values * scale
+    peak = values.max() if len(values) else 0.0
+    return values / peak * rated_power if peak > 0 else np.zeros_like(values)
+
+
 class HybridEnergyEnv(gym.Env):
-    def __init__(self):
+    """
+    Hybrid PV / wind / grid supply environment.
+
+    Without traces, solar and wind follow a random walk from a fixed initial
+    state and demand and price stay constant. With ``traces`` (an EnergyTraces)
+    the environment replays real time series instead: ``reset`` starts at a
+    random offset and every step advances one row. Episodes end after
+    ``episode_length`` steps when it is given; otherwise the trace wraps around.
+    """
+    def __init__(self, traces=None, episode_length=None):
         super(HybridEnergyEnv, self).__init__()
 
         # Define state and action sizes
@@ -79,17 +456,45 @@ class HybridEnergyEnv(gym.Env):
         )
 
         # Emission factors (gCO2/kWh)
-        self.EF_PV = 50  # Emission factor per solar panel
-        self.EF_WT = 10  # Emission factor per wind turbine
-        self.EF_grid = 800  # Emission factor for grid power
+        self.EF_PV = EF_PV  # Emission factor per solar panel
+        self.EF_WT = EF_WT  # Emission factor per wind turbine
+        self.EF_grid = EF_GRID  # Emission factor for grid power
+
+        # Random source for the state transitions. None means the global
+        # NumPy generator, so unseeded runs behave as before.
+        self.rng = None
+
+        # Trace replay (see EnergyTraces)
+        self.traces = traces
+        self.episode_length = episode_length
+        self.position = None
+        self.steps = 0
 
         # Initialize state
         self.current_state = None
         self.reset()
 
+    def seed(self, seed=None):
+        """Seed the state transitions with a dedicated random generator."""
+        self.rng = np.random.RandomState(seed)
+        return [seed]
+
+    def _start_offsets(self, count):
+        """Random episode start positions in the traces, leaving room for a full episode."""
+        rng = self.rng if self.rng is not None else np.random
+        span = len(self.traces)
+        if self.episode_length is not None:
+            span = max(1, span - self.episode_length)
+        return rng.randint(0, span, size=count)
+
     def reset(self):
         """Reset the environment to an initial state."""
-        self.current_state = np.array([0, 0, 1000, 0.1])  # Example initial state
+        self.steps = 0
+        if self.traces is not None:
+            self.position = int(self._start_offsets(1)[0])
+            self.current_state = self.traces.states(self.position)
+            return self.current_state
+        self.current_state = np.array([0, 0, DEFAULT_DEMAND, DEFAULT_GRID_PRICE])  # Example initial state
         return self.current_state
 
     def calculate_cost(self, action, state):
@@ -107,37 +512,21 @@ class HybridEnergyEnv(gym.Env):
         pv_count, wt_count, grid_power = action
         p_solar, p_wind, energy_demand, grid_price = state
         
-        # Calculate actual power generation
-        pv_power_per_panel = 0.4  # kW per panel
-        wt_power_per_turbine = 20  # kW per turbine
-        pv_power = pv_count * p_solar  # p_solar is capacity factor
-        wt_power = wt_count * p_wind  # p_wind is capacity factor
-        
-        # Capital costs (one-time costs amortized over lifetime)
-        pv_capex = 1000  # $ per kW
-        wt_capex = 1500  # $ per kW
-        pv_lifetime = 25 * 365 * 24  # hours (25 years)
-        wt_lifetime = 20 * 365 * 24  # hours (20 years)
-        
         # Amortized capital costs per hour
-        pv_capital_cost = (pv_count * pv_power_per_panel * pv_capex) / pv_lifetime
-        wt_capital_cost = (wt_count * wt_power_per_turbine * wt_capex) / wt_lifetime
+        pv_capital_cost = (pv_count * PV_POWER_PER_PANEL * PV_CAPEX) / PV_LIFETIME
+        wt_capital_cost = (wt_count * WT_POWER_PER_TURBINE * WT_CAPEX) / WT_LIFETIME
         
         # Operation and maintenance costs
-        pv_om_cost = pv_count * pv_power_per_panel * 0.015  # $0.015 per kW per hour
-        wt_om_cost = wt_count * wt_power_per_turbine * 0.025  # $0.025 per kW per hour
+        pv_om_cost = pv_count * PV_POWER_PER_PANEL * PV_OM_RATE
+        wt_om_cost = wt_count * WT_POWER_PER_TURBINE * WT_OM_RATE
         
         # Grid electricity costs (using grid_price from state)
         grid_cost = max(0, grid_power) * grid_price  # Only pay for imported power
         
-        # Revenue from excess energy if renewable generation exceeds demand
-        renewable_generation = pv_power + wt_power
-        excess_energy = max(0, renewable_generation - energy_demand)
-        
         # Land use costs
-        pv_land_area = pv_count * 8  # 8 m² per panel
-        wt_land_area = wt_count * 400  # 400 m² per wind turbine
-        land_lease_cost = (pv_land_area + wt_land_area) * 0.0001  # $ per m² per hour
+        pv_land_area = pv_count * PV_LAND_AREA
+        wt_land_area = wt_count * WT_LAND_AREA
+        land_lease_cost = (pv_land_area + wt_land_area) * LAND_LEASE_RATE
         
         # Total cost calculation
         total_cost = (
@@ -165,35 +554,21 @@ class HybridEnergyEnv(gym.Env):
         p_solar, p_wind, energy_demand, grid_price = state
         
         # Calculate actual power generation
-        pv_power_per_panel = 0.4  # kW per panel
-        wt_power_per_turbine = 20  # kW per turbine
-        pv_power = pv_count * pv_power_per_panel * p_solar  # p_solar is capacity factor
-        wt_power = wt_count * wt_power_per_turbine * p_wind  # p_wind is capacity factor
-        
-        # Convert from gCO2/kWh to kgCO2/kWh for consistency
-        ef_pv = self.EF_PV / 1000  # kg CO2/kWh
-        ef_wt = self.EF_WT / 1000  # kg CO2/kWh
-        ef_grid = self.EF_grid / 1000  # kg CO2/kWh
-        
-        # Lifecycle emissions from manufacturing and installation
-        # Amortized over lifetime of equipment
-        pv_lifetime = 25 * 365 * 24  # hours (25 years)
-        wt_lifetime = 20 * 365 * 24  # hours (20 years)
-        pv_lifecycle_co2 = 40  # kg CO2-eq per kW
-        wt_lifecycle_co2 = 11  # kg CO2-eq per kW
-        
-        # Hourly lifecycle emissions
-        pv_manufacturing_co2 = (pv_count * pv_power_per_panel * pv_lifecycle_co2) / pv_lifetime
-        wt_manufacturing_co2 = (wt_count * wt_power_per_turbine * wt_lifecycle_co2) / wt_lifetime
-        
-        # Operational emissions
-        pv_op_co2 = pv_power * ef_pv
-        wt_op_co2 = wt_power * ef_wt
-        grid_co2 = max(0, grid_power) * ef_grid
+        pv_power = pv_count * PV_POWER_PER_PANEL * p_solar  # p_solar is capacity factor
+        wt_power = wt_count * WT_POWER_PER_TURBINE * p_wind  # p_wind is capacity factor
+        
+        # Lifecycle emissions from manufacturing and installation, amortized per hour
+        pv_manufacturing_co2 = (pv_count * PV_POWER_PER_PANEL * PV_LIFECYCLE_CO2) / PV_LIFETIME
+        wt_manufacturing_co2 = (wt_count * WT_POWER_PER_TURBINE * WT_LIFECYCLE_CO2) / WT_LIFETIME
+        
+        # Operational emissions (emission factors converted from g to kg CO2/kWh)
+        pv_op_co2 = pv_power * (self.EF_PV / 1000)
+        wt_op_co2 = wt_power * (self.EF_WT / 1000)
+        grid_co2 = max(0, grid_power) * (self.EF_grid / 1000)
         
         # Maintenance emissions
-        pv_maintenance_co2 = pv_count * 0.0002  # kg CO2 per panel per hour
-        wt_maintenance_co2 = wt_count * 0.001  # kg CO2 per turbine per hour
+        pv_maintenance_co2 = pv_count * PV_MAINTENANCE_CO2
+        wt_maintenance_co2 = wt_count * WT_MAINTENANCE_CO2
         
         # Total emissions calculation
         total_co2 = (
@@ -280,18 +655,26 @@ class HybridEnergyEnv(gym.Env):
             demand_penalty = -100 * shortage / energy_demand
             reward += demand_penalty
         
-        # Update state with random fluctuations (keeping your original approach)
-        next_P_solar = np.clip(P_solar + np.random.uniform(-50, 50), 0, 1200)
-        next_P_wind = np.clip(P_wind + np.random.uniform(-2, 2), 0, 25)
-        next_state = np.array([
-            next_P_solar,
-            next_P_wind,
-            energy_demand,  # Demand remains fixed
-            grid_price  # Grid price remains fixed
-        ])
+        self.steps += 1
+        done = False
+        if self.traces is not None:
+            # Replay the next row of the traces
+            self.position = (self.position + 1) % len(self.traces)
+            next_state = self.traces.states(self.position)
+            done = self.episode_length is not None and self.steps >= self.episode_length
+        else:
+            # Update state with random fluctuations (keeping your original approach)
+            rng = self.rng if self.rng is not None else np.random
+            next_P_solar = np.clip(P_solar + rng.uniform(-50, 50), 0, 1200)
+            next_P_wind = np.clip(P_wind + rng.uniform(-2, 2), 0, 25)
+            next_state = np.array([
+                next_P_solar,
+                next_P_wind,
+                energy_demand,  # Demand remains fixed
+                grid_price  # Grid price remains fixed
+            ])
         
         self.current_state = next_state
-        done = False
         
         # Provide additional info for debugging or monitoring
         info = {
@@ -305,3 +688,128 @@ class HybridEnergyEnv(gym.Env):
         }
         
         return next_state, reward, done, info
+
+
+class BatchHybridEnergyEnv(HybridEnergyEnv):
+    """
+    Vectorized version of HybridEnergyEnv that steps ``num_envs`` states at once.
+
+    States are held as a ``(num_envs, 4)`` array and actions are given as a
+    ``(num_envs, 3)`` array. Cost, CO2, demand penalty and transitions use the
+    same formulas as the scalar environment, evaluated element-wise.
+
+    The random walk draws all solar noise and then all wind noise from one
+    generator per step, so with ``num_envs=1`` and the same seed the batch
+    environment reproduces the scalar one exactly. With traces, every
+    environment replays the series from its own random offset.
+    """
+    def __init__(self, num_envs=1, seed=None, traces=None, episode_length=None):
+        self.num_envs = num_envs
+        super(BatchHybridEnergyEnv, self).__init__(traces, episode_length)
+        if seed is not None:
+            self.seed(seed)
+            self.reset()
+
+    def reset(self):
+        """Reset every environment to the initial state."""
+        self.steps = 0
+        if self.traces is not None:
+            self.position = self._start_offsets(self.num_envs)
+            self.current_state = self.traces.states(self.position)
+            return self.current_state
+        initial_state = np.array([0, 0, DEFAULT_DEMAND, DEFAULT_GRID_PRICE])
+        self.current_state = np.tile(initial_state, (self.num_envs, 1))
+        return self.current_state
+
+    def calculate_cost(self, actions, states):
+        """Vectorized cost component for (N, 3) actions and (N, 4) states."""
+        return calculate_cost_array(actions, states)
+
+    def calculate_co2(self, actions, states):
+        """Vectorized CO2 component for (N, 3) actions and (N, 4) states."""
+        return calculate_co2_array(actions, states, self.EF_PV, self.EF_WT, self.EF_grid)
+
+    def calculate_reward(self, actions, states):
+        """Vectorized combined reward, including the demand penalty."""
+        actions = np.asarray(actions, dtype=float)
+        states = np.asarray(states, dtype=float)
+        reward = (self.cost_weight * self.calculate_cost(actions, states)) + \
+                 (self.co2_weight * self.calculate_co2(actions, states))
+
+        energy_demand = states[:, 2]
+        total_generation = (actions[:, 0] * states[:, 0]) + \
+                           (actions[:, 1] * states[:, 1]) + \
+                           actions[:, 2]
+        shortage = energy_demand - total_generation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            demand_penalty = np.where(total_generation < energy_demand,
+                                      -100 * shortage / energy_demand, 0.0)
+        return reward + demand_penalty
+
+    def step(self, actions):
+        """Execute one time step in every environment.
+
+        Args:
+            actions (array): Shape (N, 3) with [N_pv, N_wt, P_grid] per row
+
+        Returns:
+            tuple: (next_states (N, 4), rewards (N,), dones (N,), info dict of arrays)
+        """
+        actions = np.asarray(actions, dtype=float).reshape(self.num_envs, self.action_size)
+        states = self.current_state
+        P_solar, P_wind = states[:, 0], states[:, 1]
+        energy_demand, grid_price = states[:, 2], states[:, 3]
+
+        # Integer panel/turbine counts, as in the scalar int() conversion
+        N_pv = np.trunc(actions[:, 0])
+        N_wt = np.trunc(actions[:, 1])
+        P_grid_action = actions[:, 2]
+
+        P_pv = N_pv * P_solar
+        P_wt = N_wt * P_wind
+        total_renewable_energy = P_pv + P_wt
+
+        energy_deficit = np.maximum(0, energy_demand - total_renewable_energy)
+        grid_power_used = np.minimum(P_grid_action, energy_deficit)
+
+        cost_component = self.calculate_cost(actions, states)
+        co2_component = self.calculate_co2(actions, states)
+        rewards = (self.cost_weight * cost_component) + (self.co2_weight * co2_component)
+
+        total_generation = total_renewable_energy + grid_power_used
+        shortage = energy_demand - total_generation
+        demand_met = total_generation >= energy_demand
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rewards = rewards + np.where(demand_met, 0.0, -100 * shortage / energy_demand)
+
+        self.steps += 1
+        if self.traces is not None:
+            self.position = (self.position + 1) % len(self.traces)
+            next_states = self.traces.states(self.position)
+            done = self.episode_length is not None and self.steps >= self.episode_length
+            dones = np.full(self.num_envs, done)
+        else:
+            rng = self.rng if self.rng is not None else np.random
+            next_P_solar = np.clip(P_solar + rng.uniform(-50, 50, size=self.num_envs), 0, 1200)
+            next_P_wind = np.clip(P_wind + rng.uniform(-2, 2, size=self.num_envs), 0, 25)
+            next_states = np.column_stack([
+                next_P_solar,
+                next_P_wind,
+                energy_demand,  # Demand remains fixed
+                grid_price  # Grid price remains fixed
+            ])
+            dones = np.zeros(self.num_envs, dtype=bool)
+
+        self.current_state = next_states
+
+        info = {
+            'renewable_energy': total_renewable_energy,
+            'grid_energy': grid_power_used,
+            'total_energy': total_generation,
+            'energy_demand': energy_demand,
+            'cost_component': -cost_component,
+            'co2_component': -co2_component,
+            'demand_met': demand_met
+        }
+
+        return next_states, rewards, dones, info
@@ -1,8 +1,20 @@
+import random
+import numpy as np
+
+from Utils.Discretizer import RoundingDiscretizer
+from Utils.Env import score_action_grid
+from Utils.QTable import CopyOnWriteTarget, DictQTable, make_q_table
+
+
 class EnhancedQAgent:
-    def __init__(self, env, alpha=0.1, gamma=0.98, epsilon=1.0, epsilon_decay=0.995, min_epsilon=0.05, max_energy=200):
+    def __init__(self, env, alpha=0.1, gamma=0.98, epsilon=1.0, epsilon_decay=0.995, min_epsilon=0.05, max_energy=200,
+                 q_backend='dict', q_dtype=np.float32, discretizer=None):
         self.env = env
         self.max_energy = max_energy
         
+        # State discretization (see Utils/Discretizer.py); defaults to 2-decimal rounding
+        self.discretizer = discretizer if discretizer is not None else RoundingDiscretizer(2)
+        
         # Reduce action space dimensionality for better learning
         self.n_pv_values = np.arange(0, 301, 10)  # 0 to 300 panels in steps of 10
         self.n_wt_values = np.arange(0, 51, 5)    # 0 to 50 turbines in steps of 5
@@ -16,12 +28,16 @@ class EnhancedQAgent:
         self.wt_size = len(self.action_space_wt)
         self.grid_size = len(self.action_space_grid)
         self.action_count = self.pv_size * self.wt_size * self.grid_size
+        self._build_action_tables()
         
-        # Use a dictionary for sparse Q-table representation
-        self.q_table = {}
+        # Q-table storage: 'dict' keeps a sparse dict of dicts, 'dense' interns
+        # states into rows of a compact (n_states, action_count) array
+        self.q_backend = q_backend
+        self.q_dtype = q_dtype
+        self.q_table = make_q_table(q_backend, self.action_count, q_dtype)
         
-        # Target network implementation
-        self.target_q_table = {}
+        # Target network implementation: a copy-on-write view of the Q-table
+        self.target_q_table = CopyOnWriteTarget(self.q_table, save_rows=self.discretizer.n_tilings > 1)
         self.update_target_counter = 0
         self.target_update_frequency = 10  # Update target network every 10 episodes
         
@@ -40,17 +56,115 @@ class EnhancedQAgent:
         self.co2_history = []
         self.energy_violation_history = []
         
+    # Rebuilt by _build_action_tables, so pickles (save_agent, train_parallel
+    # syncs) leave them out; the feasibility cache alone can be ~15 MB
+    _DERIVED_STATE = ('action_grid', '_pv_lookup', '_wt_lookup', '_grid_lookup', '_pv_stride',
+                      '_feasible_cache', '_feasible_cache_limit')
+    
+    def __getstate__(self):
+        """Pickle the agent without the lookup tables and caches rebuilt on load."""
+        return {key: value for key, value in self.__dict__.items() if key not in self._DERIVED_STATE}
+    
+    def __setstate__(self, state):
+        """Restore a pickled agent and rebuild derived lookup tables."""
+        self.__dict__.update(state)
+        if 'discretizer' not in state:
+            self.discretizer = RoundingDiscretizer(2)
+        # Agents pickled before the pluggable backends stored plain dicts
+        if type(self.q_table) is dict:
+            self.q_table = DictQTable(self.q_table)
+            self.q_backend = 'dict'
+            self.q_dtype = np.float32
+        # Full-copy targets are replaced by a view synced to the current table
+        if not isinstance(self.target_q_table, CopyOnWriteTarget):
+            self.target_q_table = CopyOnWriteTarget(self.q_table, synced=True)
+        self._build_action_tables()
+    
+    def _build_action_tables(self):
+        """Precompute array views of the discrete action space."""
+        # Every (pv, wt, grid) action as a row, ordered by flat action index
+        pv, wt, grid = np.meshgrid(self.n_pv_values, self.n_wt_values, self.p_grid_values, indexing='ij')
+        self.action_grid = np.stack([pv.ravel(), wt.ravel(), grid.ravel()], axis=1)
+        
+        # Value -> position lookups for exact on-grid actions
+        self._pv_lookup = {v: i for i, v in enumerate(self.action_space_pv)}
+        self._wt_lookup = {v: i for i, v in enumerate(self.action_space_wt)}
+        self._grid_lookup = {v: i for i, v in enumerate(self.action_space_grid)}
+        self._pv_stride = self.wt_size * self.grid_size
+        
+        # Memoized per-state feasibility masks used by greedy selection
+        self._feasible_cache = {}
+        self._feasible_cache_limit = self.max_energy
+    
+    def score_actions(self, states):
+        """Score the full action grid against a batch of states.
+        
+        Returns:
+            tuple: (cost, co2) arrays of shape (n_states, action_count), negative like the env rewards
+        """
+        return score_action_grid(self.action_grid, states,
+                                 self.env.EF_PV, self.env.EF_WT, self.env.EF_grid)
+    
     def discretize_state(self, state):
         """Convert continuous state to a discretized key with appropriate granularity."""
-        # Increase discretization precision for better state representation
-        return tuple(np.round(state, decimals=2))
+        return self.discretizer(state)
+    
+    def _feasibility_state(self, state, state_key):
+        """State used for energy checks: the key itself when keys are rounded states, else the raw state."""
+        if self.discretizer.keys_are_states:
+            return state_key
+        return np.asarray(state, dtype=float)
+    
+    @staticmethod
+    def _tile_values(keys, row):
+        """Mean Q-value over tilings for every action stored in at least one of them."""
+        totals = {}
+        for key in keys:
+            for action_idx, value in row(key).items():
+                totals[action_idx] = totals.get(action_idx, 0.0) + value
+        return {action_idx: value / len(keys) for action_idx, value in totals.items()}
+    
+    def greedy_action_idx(self, state, mask=None):
+        """Best stored action index for a raw state, or None if the state is unknown.
+        
+        With tile coding, Q-values are averaged over the active tiles. If ``mask``
+        is given, only actions where it is True are considered.
+        """
+        if self.discretizer.n_tilings == 1:
+            return self.q_table.argmax(self.discretize_state(state), mask)
+        values = self._tile_values(self.discretizer.keys(state), self.q_table.row)
+        candidates = [i for i in values if mask is None or mask[i]]
+        return max(candidates, key=values.get, default=None)
     
     def action_to_idx(self, action):
         """Convert action tuple to flat index."""
-        pv_idx = self.action_space_pv.index(action[0])
-        wt_idx = self.action_space_wt.index(action[1])
-        grid_idx = self.action_space_grid.index(action[2])
-        return pv_idx * (self.wt_size * self.grid_size) + wt_idx * self.grid_size + grid_idx
+        try:
+            pv_idx = self._pv_lookup[action[0]]
+            wt_idx = self._wt_lookup[action[1]]
+            grid_idx = self._grid_lookup[action[2]]
+        except KeyError:
+            raise ValueError(f"Action {action} is not on the discrete action grid")
+        return pv_idx * self._pv_stride + wt_idx * self.grid_size + grid_idx
+    
+    @staticmethod
+    def _nearest_positions(grid_values, x):
+        """Position of the nearest grid value for each x (ties go to the lower value)."""
+        pos = np.clip(np.searchsorted(grid_values, x), 1, len(grid_values) - 1)
+        left = grid_values[pos - 1]
+        right = grid_values[pos]
+        return np.where(x - left <= right - x, pos - 1, pos)
+    
+    def actions_to_indices(self, actions):
+        """Snap one action or an (N, 3) batch to the nearest grid actions and return flat indices."""
+        actions = np.asarray(actions, dtype=float)
+        pv_idx = self._nearest_positions(self.n_pv_values, actions[..., 0])
+        wt_idx = self._nearest_positions(self.n_wt_values, actions[..., 1])
+        grid_idx = self._nearest_positions(self.p_grid_values, actions[..., 2])
+        return pv_idx * self._pv_stride + wt_idx * self.grid_size + grid_idx
+    
+    def snap_actions(self, actions):
+        """Snap one action or an (N, 3) batch onto the discrete action grid."""
+        return self.action_grid[self.actions_to_indices(actions)]
     
     def idx_to_action(self, idx):
         """Convert flat index to action tuple."""
@@ -80,7 +194,8 @@ class EnhancedQAgent:
     def get_valid_action(self, action, state):
         """Adjust the action to ensure total energy doesn't exceed the maximum limit."""
         pv_count, wt_count, grid_power = action
-        total_energy = self.estimate_total_energy(action, state)
+        renewable_energy = pv_count * state[0] + wt_count * state[1]
+        total_energy = renewable_energy + grid_power
         
         if total_energy <= self.max_energy:
             return action  # Action is already valid
@@ -89,27 +204,67 @@ class EnhancedQAgent:
         excess_energy = total_energy - self.max_energy
         adjusted_grid = max(0, grid_power - excess_energy)
         
-        # Find the closest valid grid power value in our discretized space
-        adjusted_grid = min(self.action_space_grid, key=lambda x: abs(x - adjusted_grid))
-        
-        adjusted_action = (pv_count, wt_count, adjusted_grid)
-        
-        # Verify the adjustment worked
-        if self.estimate_total_energy(adjusted_action, state) > self.max_energy:
-            # If still over limit, find the most conservative valid action
-            for g in self.action_space_grid:
-                test_action = (pv_count, wt_count, g)
-                if self.estimate_total_energy(test_action, state) <= self.max_energy:
-                    return test_action
-            
-            # If no valid action found with current PV/WT, reduce them
-            return (0, 0, min(self.action_space_grid, key=lambda x: x if x <= self.max_energy else float('inf')))
-        
-        return adjusted_action
+        # Snap to the closest valid grid power value in our discretized space
+        grid_pos = int(self._nearest_positions(self.p_grid_values, adjusted_grid))
+        adjusted_grid = self.action_space_grid[grid_pos]
+        if renewable_energy + adjusted_grid <= self.max_energy:
+            return (pv_count, wt_count, adjusted_grid)
+        
+        # Energy grows with grid power, so the lowest grid setting is the most
+        # conservative option; drop PV/WT as well if even that is over the limit
+        lowest_grid = self.action_space_grid[0]
+        if renewable_energy + lowest_grid <= self.max_energy:
+            return (pv_count, wt_count, lowest_grid)
+        return (0, 0, lowest_grid)
+    
+    def project_actions(self, actions, states):
+        """Vectorized get_valid_action for (N, 3) actions and (N, 4) states."""
+        actions = np.asarray(actions, dtype=float)
+        states = np.asarray(states, dtype=float)
+        pv_count, wt_count, grid_power = actions[:, 0], actions[:, 1], actions[:, 2]
+        renewable_energy = pv_count * states[:, 0] + wt_count * states[:, 1]
+        total_energy = renewable_energy + grid_power
+        
+        adjusted_grid = np.maximum(0, grid_power - (total_energy - self.max_energy))
+        adjusted_grid = self.p_grid_values[self._nearest_positions(self.p_grid_values, adjusted_grid)]
+        lowest_grid = self.p_grid_values[0]
+        
+        projected = actions.copy()
+        over_limit = total_energy > self.max_energy
+        snapped_ok = over_limit & (renewable_energy + adjusted_grid <= self.max_energy)
+        lowest_ok = over_limit & ~snapped_ok & (renewable_energy + lowest_grid <= self.max_energy)
+        fallback = over_limit & ~snapped_ok & ~lowest_ok
+        
+        projected[snapped_ok, 2] = adjusted_grid[snapped_ok]
+        projected[lowest_ok, 2] = lowest_grid
+        projected[fallback] = (0, 0, lowest_grid)
+        return projected
+    
+    def feasible_action_masks(self, states):
+        """Boolean (N, action_count) masks of actions within max_energy for each state."""
+        states = np.asarray(states, dtype=float).reshape(-1, self.env.state_size)
+        energy = (self.action_grid[:, 0] * states[:, 0:1] +
+                  self.action_grid[:, 1] * states[:, 1:2]) + self.action_grid[:, 2]
+        return energy <= self.max_energy
+    
+    def feasible_action_mask(self, state_key, cache_size=4096):
+        """Memoized feasibility mask for one discretized state."""
+        if self._feasible_cache_limit != self.max_energy:
+            self._feasible_cache = {}
+            self._feasible_cache_limit = self.max_energy
+        mask = self._feasible_cache.get(state_key)
+        if mask is None:
+            if len(self._feasible_cache) >= cache_size:
+                # Evict the oldest entry (dicts keep insertion order)
+                del self._feasible_cache[next(iter(self._feasible_cache))]
+            mask = self.feasible_action_masks(np.array(state_key, dtype=float))[0]
+            self._feasible_cache[state_key] = mask
+        return mask
     
     def choose_action(self, state):
         """Epsilon-greedy policy for action selection with energy constraint."""
-        state = self.discretize_state(state)
+        state_key = self.discretize_state(state)
+        reference = self._feasibility_state(state, state_key)
         
         # Explore: Randomly sample from action space components
         if np.random.rand() < self.epsilon:
@@ -117,68 +272,173 @@ class EnhancedQAgent:
             wt = random.choice(self.action_space_wt)
             grid = random.choice(self.action_space_grid)
             action = (pv, wt, grid)
-            return self.get_valid_action(action, state)  # Ensure action meets energy constraint
+            return self.get_valid_action(action, reference)  # Ensure action meets energy constraint
         
-        # Exploit: Use the best known action
-        if state not in self.q_table:
+        # Exploit: pick the best stored action that already meets the energy limit
+        if self.discretizer.keys_are_states:
+            mask = self.feasible_action_mask(state_key)
+        else:
+            mask = self.feasible_action_masks(reference)[0]
+        best_idx = self.greedy_action_idx(state, mask)
+        if best_idx is not None:
+            return self.idx_to_action(best_idx)
+        
+        # No feasible stored action: take the best known one and repair it
+        best_idx = self.greedy_action_idx(state)
+        if best_idx is None:
             # Initialize on-demand with a single random action
-            self.q_table[state] = {0: 0.0}
+            for key in self.discretizer.keys(state):
+                self.target_q_table.before_write(key)
+                self.q_table.set_q(key, 0, 0.0)
             action = self.idx_to_action(0)
-            return self.get_valid_action(action, state)  # Ensure action meets energy constraint
+            return self.get_valid_action(action, reference)  # Ensure action meets energy constraint
         
-        # Find best action index
-        best_idx = max(self.q_table[state], key=self.q_table[state].get)
         action = self.idx_to_action(best_idx)
-        return self.get_valid_action(action, state)  # Ensure action meets energy constraint
+        return self.get_valid_action(action, reference)  # Ensure action meets energy constraint
     
     def update_target_network(self):
-        """Update the target network with the current Q-table values."""
-        self.target_q_table = {state: dict(values) for state, values in self.q_table.items()}
+        """Update the target network with the current Q-table values.
+        
+        The target only keeps values of states changed since the previous sync,
+        so this costs O(changed states) instead of a full table copy.
+        """
+        self.target_q_table.sync()
     
     def update_q_table(self, state, action, reward, cost, co2, next_state):
         """Update Q-table using the Q-learning formula with sparse representation."""
+        if self.discretizer.n_tilings > 1:
+            return self._update_tiles(state, action, reward, next_state)
+        
         state = self.discretize_state(state)
         next_state = self.discretize_state(next_state)
         
-        # Convert action to index - handle non-discretized values
-        try:
-            pv = min(self.action_space_pv, key=lambda x: abs(x - action[0]))
-            wt = min(self.action_space_wt, key=lambda x: abs(x - action[1]))
-            grid = min(self.action_space_grid, key=lambda x: abs(x - action[2]))
-            mapped_action = (pv, wt, grid)
-            action_idx = self.action_to_idx(mapped_action)
-        except ValueError:
-            # Fallback if conversion fails
-            action_idx = 0
-        
-        # Initialize state entry if new
-        if state not in self.q_table:
-            self.q_table[state] = {}
-        
-        # Initialize action value if new
-        if action_idx not in self.q_table[state]:
-            self.q_table[state][action_idx] = 0.0
+        # Convert action to index - on-grid actions take the O(1) lookup,
+        # anything else is snapped to the nearest grid values
+        action_idx = self._action_idx(action)
+        
+        # Current value, initialized to zero if new
+        q_value = self.q_table.get_q(state, action_idx, 0.0)
         
         # Add to visited states
         self.visited_states.add(state)
         
         # Find maximum Q-value for next state using target network
-        if next_state in self.target_q_table and self.target_q_table[next_state]:
-            best_next_q = max(self.target_q_table[next_state].values())
-        else:
+        best_next_q = self.target_q_table.max_value(next_state)
+        if best_next_q is None:
             best_next_q = 0.0
         
         # Update rule
-        self.q_table[state][action_idx] += self.alpha * (
-            reward + self.gamma * best_next_q - self.q_table[state][action_idx]
-        )
-        
-        # Remove near-zero Q-values to save memory
-        if abs(self.q_table[state][action_idx]) < 1e-6:
-            del self.q_table[state][action_idx]
-            # Remove empty state entries
-            if not self.q_table[state]:
-                del self.q_table[state]
+        q_value += self.alpha * (reward + self.gamma * best_next_q - q_value)
+        
+        # Remove near-zero Q-values to save memory (empty states are dropped too)
+        self.target_q_table.before_write(state)
+        if abs(q_value) < 1e-6:
+            self.q_table.delete_q(state, action_idx)
+        else:
+            self.q_table.set_q(state, action_idx, q_value)
+    
+    def _action_idx(self, action):
+        """Flat index of an action, snapping off-grid actions to the nearest grid values."""
+        try:
+            return self.action_to_idx(action)
+        except (ValueError, TypeError):
+            return int(self.actions_to_indices(action))
+    
+    def _update_tiles(self, state, action, reward, next_state):
+        """Q-learning update with tile coding: Q(s, a) is the mean over the active tiles,
+        and every active tile moves by the same TD step."""
+        keys = self.discretizer.keys(state)
+        next_keys = self.discretizer.keys(next_state)
+        action_idx = self._action_idx(action)
+        
+        current = [self.q_table.get_q(key, action_idx, 0.0) for key in keys]
+        q_value = sum(current) / len(keys)
+        self.visited_states.update(keys)
+        
+        next_values = self._tile_values(next_keys, self.target_q_table.row)
+        best_next_q = max(next_values.values()) if next_values else 0.0
+        td_step = self.alpha * (reward + self.gamma * best_next_q - q_value)
+        
+        for key, value in zip(keys, current):
+            value += td_step
+            self.target_q_table.before_write(key)
+            if abs(value) < 1e-6:
+                self.q_table.delete_q(key, action_idx)
+            else:
+                self.q_table.set_q(key, action_idx, value)
+    
+    def run_episode(self, max_steps, learn=True, record=False):
+        """Run one episode with the current policy.
+        
+        Args:
+            max_steps: Maximum number of steps in the episode
+            learn: Update the Q-table after every step
+            record: Also return the transitions as arrays (states, actions, rewards, next_states)
+        
+        Returns:
+            tuple: (total_reward, episode_cost, episode_co2, episode_violations, transitions or None)
+        """
+        state = self.env.reset()
+        total_reward = 0
+        episode_violations = 0
+        episode_cost = 0
+        episode_co2 = 0
+        states, actions, step_rewards, next_states = [], [], [], []
+        
+        for step in range(max_steps):
+            action = self.choose_action(state)
+            
+            # Check if original action would violate energy constraint
+            total_energy = self.estimate_total_energy(action, state)
+            if total_energy > self.max_energy:
+                episode_violations += 1
+            
+            # Calculate individual reward components
+            cost = self.env.calculate_cost(action, state)
+            co2 = self.env.calculate_co2(action, state)
+            
+            # Combined reward with weights
+            reward = (self.env.cost_weight * cost) + (self.env.co2_weight * co2)
+            
+            # Additional penalty for actions that would exceed energy limit
+            if total_energy > self.max_energy:
+                energy_penalty = -abs(total_energy - self.max_energy) * 0.1  # Scale penalty by excess
+                reward += energy_penalty
+            
+            next_state, env_reward, done, _ = self.env.step(action)
+            
+            # Update Q-table with our calculated reward
+            if learn:
+                self.update_q_table(state, action, reward, cost, co2, next_state)
+            if record:
+                states.append(state)
+                actions.append(action)
+                step_rewards.append(reward)
+                next_states.append(next_state)
+            
+            state = next_state
+            total_reward += reward
+            episode_cost += cost
+            episode_co2 += co2
+            
+            if done:
+                break
+        
+        transitions = None
+        if record:
+            transitions = (np.array(states, dtype=float), np.array(actions, dtype=float),
+                           np.array(step_rewards, dtype=float), np.array(next_states, dtype=float))
+        return total_reward, episode_cost, episode_co2, episode_violations, transitions
+    
+    def finish_episode(self):
+        """End-of-episode bookkeeping: periodic target network sync and epsilon decay."""
+        # Update target network periodically
+        self.update_target_counter += 1
+        if self.update_target_counter % self.target_update_frequency == 0:
+            self.update_target_network()
+        
+        # Decay epsilon faster than before
+        self.epsilon = max(self.min_epsilon, self.epsilon * self.epsilon_decay)
     
     def train(self, episodes=2000, max_steps=15000, cost_weight=0.5, co2_weight=0.5):
         """Train the agent with separate tracking of cost and CO2 metrics."""
@@ -191,52 +451,8 @@ class EnhancedQAgent:
         self.update_target_network()
         
         for episode in range(episodes):
-            state = self.env.reset()
-            total_reward = 0
-            episode_violations = 0
-            episode_cost = 0
-            episode_co2 = 0
-            
-            for step in range(max_steps):
-                action = self.choose_action(state)
-                
-                # Check if original action would violate energy constraint
-                total_energy = self.estimate_total_energy(action, state)
-                if total_energy > self.max_energy:
-                    episode_violations += 1
-                
-                # Calculate individual reward components
-                cost = env.calculate_cost(action, state)
-                co2 = env.calculate_co2(action, state)
-                
-                # Combined reward with weights
-                reward = (env.cost_weight * cost) + (env.co2_weight * co2)
-                
-                # Additional penalty for actions that would exceed energy limit
-                if total_energy > self.max_energy:
-                    energy_penalty = -abs(total_energy - self.max_energy) * 0.1  # Scale penalty by excess
-                    reward += energy_penalty
-                
-                next_state, env_reward, done, _ = self.env.step(action)
-                
-                # Update Q-table with our calculated reward
-                self.update_q_table(state, action, reward, cost, co2, next_state)
-                
-                state = next_state
-                total_reward += reward
-                episode_cost += cost
-                episode_co2 += co2
-                
-                if done:
-                    break
-            
-            # Update target network periodically
-            self.update_target_counter += 1
-            if self.update_target_counter % self.target_update_frequency == 0:
-                self.update_target_network()
-            
-            # Decay epsilon faster than before
-            self.epsilon = max(self.min_epsilon, self.epsilon * self.epsilon_decay)
+            total_reward, episode_cost, episode_co2, episode_violations, _ = self.run_episode(max_steps)
+            self.finish_episode()
             
             # Record metrics
             rewards.append(total_reward)
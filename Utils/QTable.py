@@ -0,0 +1,345 @@
+import numpy as np
+
+
+class DictQTable(dict):
+    """
+    Sparse Q-table stored as a dict of dicts: ``{state_key: {action_idx: q_value}}``.
+
+    This is the original EnhancedQAgent storage. The helper methods give it the
+    same interface as DenseQTable so the agent can use either backend.
+    """
+    def argmax(self, key, mask=None):
+        """Return the best known action index for a state, or None if it has no entries.
+
+        If ``mask`` is given (a boolean array over action indices), only stored
+        actions where it is True are considered.
+        """
+        values = self.get(key)
+        if not values:
+            return None
+        if mask is None:
+            return max(values, key=values.get)
+        return max((i for i in values if mask[i]), key=values.get, default=None)
+
+    def max_value(self, key):
+        """Return the highest Q-value stored for a state, or None if it has no entries."""
+        values = self.get(key)
+        if not values:
+            return None
+        return max(values.values())
+
+    def get_q(self, key, action_idx, default=None):
+        """Return a single Q-value, or ``default`` if it is not stored."""
+        values = self.get(key)
+        if values is None:
+            return default
+        return values.get(action_idx, default)
+
+    def set_q(self, key, action_idx, value):
+        """Store a single Q-value, creating the state entry if needed."""
+        values = self.get(key)
+        if values is None:
+            values = self[key] = {}
+        values[action_idx] = value
+
+    def delete_q(self, key, action_idx):
+        """Remove a single Q-value and drop the state once it has no entries left."""
+        values = self.get(key)
+        if values is None or action_idx not in values:
+            return
+        del values[action_idx]
+        if not values:
+            del self[key]
+
+    def row(self, key):
+        """Return the stored entries of a state as a plain ``{action_idx: q_value}`` dict."""
+        return dict(self.get(key, {}))
+
+    def set_row(self, key, row):
+        """Replace all entries of a state with ``row``; an empty row removes the state."""
+        if row:
+            self[key] = dict(row)
+        else:
+            self.pop(key, None)
+
+    def snapshot(self):
+        """Return an independent copy of the table."""
+        return DictQTable({key: dict(values) for key, values in self.items()})
+
+
+class DenseQTable:
+    """
+    Q-table that interns state keys into integer row ids and keeps Q-values in
+    one contiguous ``(n_states, action_count)`` array.
+
+    Missing entries are stored as NaN, so the table keeps the dict backend's
+    semantics: only stored actions take part in the argmax and max, and states
+    whose entries were all removed count as absent. Rows grow by doubling.
+    Ties are broken by the lowest action index rather than insertion order.
+
+    A row whose last entry is deleted is released: its key leaves the index and
+    its id goes on a free list that the next new state reuses, so the capacity
+    follows the number of live states rather than every state ever seen.
+    Released rows keep their old key in ``keys_by_row`` with a count of 0;
+    ``snapshot`` and checkpoints keep only the live rows.
+    """
+    def __init__(self, action_count, dtype=np.float32, initial_rows=1024):
+        self.action_count = action_count
+        self.dtype = np.dtype(dtype)
+        self._index = {}  # state key -> row id
+        self._keys_by_row = []  # row id -> state key
+        self._key_array = None  # (n_rows, key_size) array form of the keys, built on demand
+        self.values = np.full((initial_rows, action_count), np.nan, dtype=self.dtype)
+        self.counts = np.zeros(initial_rows, dtype=np.int32)  # Stored entries per row
+        self.n_rows = 0
+        self.n_nonempty = 0
+        self._free = []  # Released row ids, reused before the table grows
+
+    def _grow(self):
+        """Double the row capacity."""
+        capacity = max(1, 2 * len(self.values))
+        values = np.full((capacity, self.action_count), np.nan, dtype=self.dtype)
+        values[:self.n_rows] = self.values[:self.n_rows]
+        counts = np.zeros(capacity, dtype=np.int32)
+        counts[:self.n_rows] = self.counts[:self.n_rows]
+        self.values, self.counts = values, counts
+
+    @classmethod
+    def from_arrays(cls, keys, values, counts):
+        """Build a table directly over existing arrays (e.g. memory-mapped from a checkpoint).
+
+        The key -> row dict is only built the first time a single-state lookup
+        needs it, so opening a table costs nothing per state.
+        """
+        table = cls.__new__(cls)
+        table.action_count = values.shape[1]
+        table.dtype = values.dtype
+        table._index = None
+        table._keys_by_row = None
+        table._key_array = keys
+        table.values = values
+        table.counts = counts
+        table.n_rows = len(keys)
+        table.n_nonempty = int(np.count_nonzero(counts[:len(keys)]))
+        table._free = None  # Built with the index, from the rows without entries
+        return table
+
+    @property
+    def keys_by_row(self):
+        """Row id -> state key list."""
+        if self._keys_by_row is None:
+            self._keys_by_row = [tuple(key) for key in self._key_array[:self.n_rows].tolist()]
+        return self._keys_by_row
+
+    @property
+    def index(self):
+        """State key -> row id dict (live rows only)."""
+        if self._index is None:
+            live = self.counts[:self.n_rows] > 0
+            self._index = {key: rid for rid, key in enumerate(self.keys_by_row) if live[rid]}
+            self._free = np.flatnonzero(~live).tolist()
+        return self._index
+
+    def key_array(self):
+        """Return the state keys of all rows as an (n_rows, key_size) array."""
+        if self._key_array is None or len(self._key_array) != self.n_rows:
+            self._key_array = np.array(self.keys_by_row, dtype=float)
+        return self._key_array[:self.n_rows]
+
+    def row_id(self, key, create=False):
+        """Return the row id of a state key, optionally interning it."""
+        rid = self.index.get(key)
+        if rid is None and create:
+            if self._free:
+                rid = self._free.pop()
+                self.keys_by_row[rid] = key
+            else:
+                if self.n_rows == len(self.values):
+                    self._grow()
+                rid = self.n_rows
+                self.keys_by_row.append(key)
+                self.n_rows += 1
+            self.index[key] = rid
+            self._key_array = None
+        return rid
+
+    def __contains__(self, key):
+        rid = self.index.get(key)
+        return rid is not None and self.counts[rid] > 0
+
+    def __len__(self):
+        return self.n_nonempty
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        """Return the state keys that have at least one stored entry."""
+        return [key for key, rid in self.index.items() if self.counts[rid] > 0]
+
+    def argmax(self, key, mask=None):
+        """Return the best known action index for a state, or None if it has no entries.
+
+        If ``mask`` is given (a boolean array over action indices), only stored
+        actions where it is True are considered.
+        """
+        rid = self.index.get(key)
+        if rid is None or self.counts[rid] == 0:
+            return None
+        values = self.values[rid]
+        if mask is not None:
+            values = np.where(mask, values, np.nan)
+            if np.isnan(values).all():
+                return None
+        return int(np.nanargmax(values))
+
+    def max_value(self, key):
+        """Return the highest Q-value stored for a state, or None if it has no entries."""
+        rid = self.index.get(key)
+        if rid is None or self.counts[rid] == 0:
+            return None
+        return float(np.nanmax(self.values[rid]))
+
+    def get_q(self, key, action_idx, default=None):
+        """Return a single Q-value, or ``default`` if it is not stored."""
+        rid = self.index.get(key)
+        if rid is None:
+            return default
+        value = self.values[rid, action_idx]
+        return default if np.isnan(value) else float(value)
+
+    def set_q(self, key, action_idx, value):
+        """Store a single Q-value, interning the state if needed."""
+        rid = self.row_id(key, create=True)
+        if np.isnan(self.values[rid, action_idx]):
+            if self.counts[rid] == 0:
+                self.n_nonempty += 1
+            self.counts[rid] += 1
+        self.values[rid, action_idx] = value
+
+    def delete_q(self, key, action_idx):
+        """Remove a single Q-value, releasing the row once it has no entries left."""
+        rid = self.index.get(key)
+        if rid is None or np.isnan(self.values[rid, action_idx]):
+            return
+        self.values[rid, action_idx] = np.nan
+        self.counts[rid] -= 1
+        if self.counts[rid] == 0:
+            self.n_nonempty -= 1
+            del self.index[key]
+            self._free.append(rid)
+
+    def row(self, key):
+        """Return the stored entries of a state as a plain ``{action_idx: q_value}`` dict."""
+        rid = self.index.get(key)
+        if rid is None:
+            return {}
+        values = self.values[rid]
+        stored = np.flatnonzero(~np.isnan(values))
+        return {int(i): float(values[i]) for i in stored}
+
+    def set_row(self, key, row):
+        """Replace all entries of a state with ``row``; an empty row removes the state."""
+        rid = self.index.get(key)
+        if not row:
+            if rid is not None:
+                self.values[rid] = np.nan
+                self.counts[rid] = 0
+                self.n_nonempty -= 1
+                del self.index[key]
+                self._free.append(rid)
+            return
+        if rid is None:
+            rid = self.row_id(key, create=True)
+        if self.counts[rid] == 0:
+            self.n_nonempty += 1
+        self.values[rid] = np.nan
+        self.values[rid, list(row.keys())] = list(row.values())
+        self.counts[rid] = len(row)
+
+    def live_rows(self):
+        """Row ids that hold at least one entry, in row order."""
+        return np.flatnonzero(self.counts[:self.n_rows] > 0)
+
+    def snapshot(self):
+        """Return an independent copy of the table, compacted to the live rows."""
+        rows = self.live_rows()
+        keys_by_row = self.keys_by_row
+        table = DenseQTable.__new__(DenseQTable)
+        table.action_count = self.action_count
+        table.dtype = self.dtype
+        table._keys_by_row = [keys_by_row[rid] for rid in rows]
+        table._index = {key: rid for rid, key in enumerate(table._keys_by_row)}
+        table._key_array = None
+        table.values = np.full((max(len(rows), 1), self.action_count), np.nan, dtype=self.dtype)
+        table.values[:len(rows)] = self.values[rows]
+        table.counts = np.zeros(max(len(rows), 1), dtype=np.int32)
+        table.counts[:len(rows)] = self.counts[rows]
+        table.n_rows = len(rows)
+        table.n_nonempty = len(rows)
+        table._free = []
+        return table
+
+
+class CopyOnWriteTarget:
+    """
+    Target network view of a Q-table, frozen at the last ``sync``.
+
+    Instead of copying the whole table, the target shares it with the online
+    Q-table and records a state's target value (its maximum Q-value at the last
+    sync) the first time that state is written afterwards. Lookups of untouched
+    states read the live table. A sync only discards the recorded values, so it
+    costs O(states changed since the last sync) and memory stays proportional
+    to that set rather than doubling.
+
+    With ``save_rows=True`` the whole pre-sync row is recorded instead of its
+    maximum, for callers that combine several rows (e.g. tile coding).
+    """
+    def __init__(self, table, synced=False, save_rows=False):
+        self.table = table
+        self.saved = {}  # state key -> max Q-value (or row) at the last sync
+        self.synced = synced  # Before the first sync the target is empty
+        self.save_rows = save_rows
+
+    def before_write(self, key):
+        """Record a state's target value before the online table modifies it."""
+        if self.synced and key not in self.saved:
+            self.saved[key] = self.table.row(key) if self.save_rows else self.table.max_value(key)
+
+    def max_value(self, key):
+        """Return the highest Q-value of a state as of the last sync, or None."""
+        if not self.synced:
+            return None
+        if key in self.saved:
+            saved = self.saved[key]
+            if self.save_rows:
+                return max(saved.values()) if saved else None
+            return saved
+        return self.table.max_value(key)
+
+    def row(self, key):
+        """Return a state's ``{action_idx: q_value}`` entries as of the last sync (needs save_rows)."""
+        if not self.save_rows:
+            raise ValueError("CopyOnWriteTarget.row requires save_rows=True")
+        if not self.synced:
+            return {}
+        if key in self.saved:
+            return self.saved[key]
+        return self.table.row(key)
+
+    def sync(self):
+        """Make the target match the current online table."""
+        self.saved = {}
+        self.synced = True
+
+    def __len__(self):
+        return len(self.saved)
+
+
+def make_q_table(backend, action_count, dtype=np.float32):
+    """Create an empty Q-table for the given backend name ('dict' or 'dense')."""
+    if backend == 'dict':
+        return DictQTable()
+    if backend == 'dense':
+        return DenseQTable(action_count, dtype=dtype)
+    raise ValueError(f"Unknown Q-table backend: {backend!r} (expected 'dict' or 'dense')")
@@ -1,80 +1,165 @@
-import random
+import numpy as np
 
-def get_best_actions(agent, states):
+
+def _minimal_excess_combos(pv_values, wt_values, pv_power, wind_power, grid, demand, block_size=2048):
+    """
+    For each state, find the (pv, wt) pair whose energy plus ``grid`` covers
+    ``demand`` with the least excess, searching all pairs at once with broadcast
+    (block, P, W) arrays.
+
+    Ties are resolved like the original nested loop: PV options are visited by
+    decreasing energy, then WT options by decreasing energy, and the first
+    minimum wins.
+
+    States are processed ``block_size`` at a time, so peak memory stays at a
+    few (block_size, P, W) arrays however many states need the search.
+
+    Returns:
+    - (pv, wt, found) arrays; ``found`` is False where no pair covers demand
+    """
+    n = len(demand)
+    pv = np.empty(n, dtype=pv_values.dtype)
+    wt = np.empty(n, dtype=wt_values.dtype)
+    found = np.zeros(n, dtype=bool)
+    for start in range(0, n, block_size):
+        block = slice(start, start + block_size)
+        pv[block], wt[block], found[block] = _minimal_excess_block(
+            pv_values, wt_values, pv_power[block], wind_power[block], grid[block], demand[block])
+    return pv, wt, found
+
+
+def _minimal_excess_block(pv_values, wt_values, pv_power, wind_power, grid, demand):
+    """One block of _minimal_excess_combos."""
+    pv_energy = pv_values[np.newaxis, :] * pv_power[:, np.newaxis]
+    wt_energy = wt_values[np.newaxis, :] * wind_power[:, np.newaxis]
+
+    # Visit order of the original loop: stable sort by decreasing energy
+    pv_order = np.argsort(-pv_energy, axis=1, kind='stable')
+    wt_order = np.argsort(-wt_energy, axis=1, kind='stable')
+    pv_sorted = np.take_along_axis(pv_energy, pv_order, axis=1)
+    wt_sorted = np.take_along_axis(wt_energy, wt_order, axis=1)
+
+    # Excess of every pair, in place; pairs short of demand become inf
+    excess = pv_sorted[:, :, np.newaxis] + wt_sorted[:, np.newaxis, :]
+    excess += grid[:, np.newaxis, np.newaxis]
+    excess -= demand[:, np.newaxis, np.newaxis]
+    excess[excess < 0] = np.inf
+    flat = excess.reshape(len(demand), -1)
+    best = flat.argmin(axis=1)  # First minimum in visit order
+    rows = np.arange(len(demand))
+    found = np.isfinite(flat[rows, best])
+
+    pv_pos, wt_pos = np.divmod(best, wt_values.size)
+    pv = pv_values[pv_order[rows, pv_pos]]
+    wt = wt_values[wt_order[rows, wt_pos]]
+    return pv, wt, found
+
+
+def _queried_best_actions(agent, states):
+    """
+    Best stored action of each state (``agent.greedy_action_idx``), resolving
+    only the distinct keys among ``states`` rather than the whole Q-table.
+
+    Returns:
+    - ((N, 3) actions, (N,) bool mask of states found in the Q-table)
+    """
+    lattice = agent.discretizer.lattice(states).reshape(len(states), -1)
+    _, first, inverse = np.unique(lattice, axis=0, return_index=True, return_inverse=True)
+    best = np.zeros(len(first), dtype=np.int64)
+    known = np.zeros(len(first), dtype=bool)
+    for i, row in enumerate(first):
+        idx = agent.greedy_action_idx(states[row])
+        if idx is not None:
+            best[i] = idx
+            known[i] = True
+    inverse = inverse.reshape(-1)
+    return agent.action_grid[best[inverse]], known[inverse]
+
+
+def best_actions_array(agent, states, rng=None, policy=None):
+    """
+    Array version of get_best_actions.
+
+    Parameters:
+    - agent: The QAgent instance
+    - states: (N, 4) array of states
+    - rng: np.random.Generator or seed used for the random renewable fallback
+    - policy: GreedyPolicy of the agent, used to look up every state's best
+      stored action in one batch. If None, only the distinct keys among
+      ``states`` are looked up in the Q-table, which suits small queries;
+      callers that run many large batches should build the policy once. With
+      fallback='nearest', states missing from the Q-table take PV/WT from the
+      nearest known state, and only states without a neighbour within its
+      cutoff fall back to random
+
+    Returns:
+    - (N, 3) integer array of (pv, wt, grid) actions
+    """
+    rng = np.random.default_rng(rng)
+    states = np.asarray(states, dtype=float).reshape(-1, 4)
+    pv_values = np.asarray(agent.action_space_pv)
+    wt_values = np.asarray(agent.action_space_wt)
+    grid_options = np.sort(np.asarray(agent.action_space_grid))
+
+    pv_power = states[:, 0]  # Available PV power per unit
+    wind_power = states[:, 1]  # Available wind power per unit
+    demand = states[:, 2]
+
+    # Best renewable action from the Q-table where available (grid is ignored)
+    if policy is None:
+        best, known = _queried_best_actions(agent, states)
+    else:
+        best, known = policy.best_stored_actions(states)
+    pv_count = best[:, 0].astype(pv_values.dtype)
+    wt_count = best[:, 1].astype(wt_values.dtype)
+
+    # Nearest known state's renewable action for states not in the Q-table
+    missing = ~known
+    if policy is not None and policy.nearest_index is not None and missing.any():
+        nearest, found = policy.nearest_actions(states[missing])
+        rows = np.flatnonzero(missing)[found]
+        pv_count[rows] = nearest[found, 0]
+        wt_count[rows] = nearest[found, 1]
+        missing[rows] = False
+
+    # Random renewable action for the remaining states
+    pv_count[missing] = rng.choice(pv_values, size=missing.sum())
+    wt_count[missing] = rng.choice(wt_values, size=missing.sum())
+
+    # Smallest grid option that covers the remaining demand, else the largest one
+    renewable_energy = pv_count * pv_power + wt_count * wind_power
+    required_grid_power = np.maximum(0, demand - renewable_energy)
+    grid_pos = np.searchsorted(grid_options, required_grid_power, side='left')
+    short = grid_pos == len(grid_options)
+    selected_grid = grid_options[np.minimum(grid_pos, len(grid_options) - 1)]
+
+    # If even max grid plus renewables doesn't meet demand, look for the
+    # renewable combination that covers it with the least excess
+    retry = short & (renewable_energy + selected_grid < demand)
+    if retry.any():
+        pv, wt, found = _minimal_excess_combos(pv_values, wt_values, pv_power[retry], wind_power[retry],
+                                               selected_grid[retry], demand[retry])
+        rows = np.flatnonzero(retry)[found]
+        pv_count[rows] = pv[found]
+        wt_count[rows] = wt[found]
+
+    return np.column_stack([pv_count, wt_count, selected_grid])
+
+
+def get_best_actions(agent, states, rng=None, policy=None):
     """
     Get the best actions for multiple states using the trained Q-table,
     ensuring demand is always met while minimizing grid usage.
-    
+
     Parameters:
     - agent: The QAgent instance
     - states: List of states to evaluate
-    
+    - rng: np.random.Generator or seed for the random fallback, so results are reproducible
+    - policy: Optional GreedyPolicy (see best_actions_array); with fallback='nearest' it
+      also covers states missing from the Q-table
+
     Returns:
     - Dictionary mapping each state to its best action tuple (pv, wt, grid)
     """
-    best_actions = {}
-    for state in states:
-        state_key = agent.discretize_state(state)  # Convert to discrete form
-        demand = state[2]  # Extract demand from state
-        pv_power = state[0]  # Available PV power per unit
-        wind_power = state[1]  # Available wind power per unit
-        
-        # Get best renewable action from Q-table if available
-        if state_key in agent.q_table and agent.q_table[state_key]:
-            best_idx = max(agent.q_table[state_key], key=agent.q_table[state_key].get)
-            pv_count, wt_count, _ = agent.idx_to_action(best_idx)  # Ignore grid from Q-table
-        else:
-            # Fallback to a random action for renewables if state is not in Q-table
-            pv_count = random.choice(agent.action_space_pv)
-            wt_count = random.choice(agent.action_space_wt)
-        
-        # Calculate energy from renewables with the selected action
-        pv_energy = pv_count * pv_power
-        wt_energy = wt_count * wind_power
-        renewable_energy = pv_energy + wt_energy
-        
-        # Calculate exact grid power needed to meet demand
-        required_grid_power = max(0, demand - renewable_energy)
-        
-        # Find the grid action value that is closest to but not less than required
-        grid_options = sorted(agent.action_space_grid)
-        
-        # Find the smallest grid value that meets the requirement
-        selected_grid = None
-        for grid_option in grid_options:
-            if grid_option >= required_grid_power:
-                selected_grid = grid_option
-                break
-                
-        # If no grid option is large enough, take the maximum available
-        if selected_grid is None:
-            selected_grid = max(grid_options)
-            
-            # If even max grid plus renewables doesn't meet demand, 
-            # try to increase renewable usage
-            if renewable_energy + selected_grid < demand:
-                # Sort renewable options by energy production (highest first)
-                pv_options = sorted([(p, p * pv_power) for p in agent.action_space_pv], 
-                                   key=lambda x: x[1], reverse=True)
-                wt_options = sorted([(w, w * wind_power) for w in agent.action_space_wt], 
-                                   key=lambda x: x[1], reverse=True)
-                
-                # Try different combinations to minimize excess while meeting demand
-                best_excess = float('inf')
-                best_combo = (pv_count, wt_count, selected_grid)
-                
-                for p, p_energy in pv_options:
-                    for w, w_energy in wt_options:
-                        combined_energy = p_energy + w_energy + selected_grid
-                        if combined_energy >= demand:
-                            excess = combined_energy - demand
-                            if excess < best_excess:
-                                best_excess = excess
-                                best_combo = (p, w, selected_grid)
-                
-                pv_count, wt_count, selected_grid = best_combo
-        
-        # Create the final action with exact grid power needed
-        best_actions[tuple(state)] = (pv_count, wt_count, selected_grid)
-    
-    return best_actions
+    actions = best_actions_array(agent, states, rng, policy)
+    return {tuple(state): tuple(action) for state, action in zip(states, actions)}
@@ -0,0 +1,248 @@
+import json
+import struct
+
+import numpy as np
+
+from Utils.Discretizer import RoundingDiscretizer, discretizer_from_config
+from Utils.Env import HybridEnergyEnv
+from Utils.QAgent import EnhancedQAgent
+from Utils.QTable import CopyOnWriteTarget, DenseQTable, DictQTable
+
+# File layout:
+#   magic (8 bytes) | format version (uint32) | header length (uint32) | JSON header
+#   | padding to ALIGNMENT | array sections, each starting on an ALIGNMENT boundary
+# Section offsets in the header are relative to the first section. Uncompressed
+# sections are raw C-order arrays, so they can be memory-mapped in place.
+MAGIC = b"LBDQCKPT"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREAMBLE = struct.Struct("<8sII")
+
+HYPERPARAMETERS = ('alpha', 'gamma', 'epsilon', 'epsilon_decay', 'min_epsilon', 'max_energy',
+                   'target_update_frequency', 'update_target_counter')
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _compressor(compression):
+    """Return (compress, decompress) callables for a compression name."""
+    if compression is None:
+        return None, None
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression requires the 'zstandard' package (pip install zstandard)")
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    if compression == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImportError("lz4 compression requires the 'lz4' package (pip install lz4)")
+        return lz4.frame.compress, lz4.frame.decompress
+    raise ValueError(f"Unknown compression: {compression!r} (expected None, 'zstd' or 'lz4')")
+
+
+def _table_arrays(agent):
+    """Return the Q-table as named arrays and the layout name.
+
+    Dense tables are stored as their live rows; dict tables are stored in CSR
+    form so a sparse table does not blow up into a full (n_states,
+    action_count) matrix.
+    """
+    table = agent.q_table
+    if isinstance(table, DenseQTable):
+        # Only live rows; released rows are dropped so the file is compacted
+        rows = table.live_rows()
+        return 'dense', {
+            'keys': np.ascontiguousarray(table.key_array()[rows], dtype=np.float64),
+            'values': np.ascontiguousarray(table.values[rows]),
+            'counts': np.ascontiguousarray(table.counts[rows]),
+        }
+
+    keys = list(table.keys())
+    row_ptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    columns, values = [], []
+    for i, key in enumerate(keys):
+        row = table[key]
+        columns.extend(row.keys())
+        values.extend(row.values())
+        row_ptr[i + 1] = len(columns)
+    return 'csr', {
+        'keys': np.array(keys, dtype=np.float64).reshape(len(keys), -1),
+        'row_ptr': row_ptr,
+        'columns': np.array(columns, dtype=np.int32),
+        'values': np.array(values, dtype=np.float64),
+    }
+
+
+def save_checkpoint(agent, filepath, compression=None):
+    """
+    Save an EnhancedQAgent's Q-table and hyperparameters in the binary checkpoint format.
+
+    The environment and the training history lists are not stored.
+
+    Args:
+        agent: The EnhancedQAgent instance to save
+        filepath: Destination path
+        compression: None (memory-mappable), 'zstd' or 'lz4'
+    """
+    compress, _ = _compressor(compression)
+    layout, arrays = _table_arrays(agent)
+
+    sections = {}
+    blobs = []
+    offset = 0
+    for name, array in arrays.items():
+        raw = array.tobytes()
+        blob = compress(raw) if compress else raw
+        sections[name] = {
+            'dtype': array.dtype.str,
+            'shape': list(array.shape),
+            'offset': offset,
+            'nbytes': len(blob),
+        }
+        blobs.append((offset, blob))
+        offset = _align(offset + len(blob))
+
+    header = {
+        'layout': layout,
+        'compression': compression,
+        'q_backend': agent.q_backend,
+        'q_dtype': np.dtype(agent.q_dtype).str,
+        'hyperparameters': {name: getattr(agent, name) for name in HYPERPARAMETERS},
+        'discretizer': agent.discretizer.config(),
+        'action_space': {
+            'pv': [int(v) for v in agent.action_space_pv],
+            'wt': [int(v) for v in agent.action_space_wt],
+            'grid': [int(v) for v in agent.action_space_grid],
+        },
+        'sections': sections,
+    }
+    header_bytes = json.dumps(header, default=lambda value: value.item()).encode('utf-8')
+    data_start = _align(PREAMBLE.size + len(header_bytes))
+
+    with open(filepath, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for section_offset, blob in blobs:
+            f.seek(data_start + section_offset)
+            f.write(blob)
+        f.truncate(data_start + offset)
+
+    print(f"Checkpoint saved to {filepath} ({layout} layout, compression={compression})")
+    print(f"Q-table size: {len(agent.q_table)} states")
+
+
+def read_header(filepath):
+    """Return (header dict, absolute offset of the first section) for a checkpoint file."""
+    with open(filepath, 'rb') as f:
+        magic, version, header_len = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{filepath} is not an agent checkpoint")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Checkpoint format version {version} is newer than supported ({FORMAT_VERSION})")
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    return header, _align(PREAMBLE.size + header_len)
+
+
+def _read_sections(filepath, header, data_start, mmap_mode):
+    """Load every section, memory-mapping uncompressed ones."""
+    _, decompress = _compressor(header['compression'])
+    arrays = {}
+    with open(filepath, 'rb') as f:
+        for name, section in header['sections'].items():
+            dtype = np.dtype(section['dtype'])
+            shape = tuple(section['shape'])
+            offset = data_start + section['offset']
+            if decompress is None and mmap_mode is not None and np.prod(shape) > 0:
+                arrays[name] = np.memmap(filepath, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape)
+            else:
+                f.seek(offset)
+                raw = f.read(section['nbytes'])
+                if decompress is not None:
+                    raw = decompress(raw)
+                arrays[name] = np.frombuffer(raw, dtype=dtype).reshape(shape).copy()
+    return arrays
+
+
+def load_checkpoint(filepath, env=None, mmap_mode='c'):
+    """
+    Load an agent saved with save_checkpoint.
+
+    Uncompressed dense checkpoints are memory-mapped, so opening one only reads
+    the header and the OS shares the pages between processes. The default
+    ``mmap_mode='c'`` is copy-on-write: the agent can keep training without
+    touching the file. Use ``mmap_mode=None`` to read everything into memory.
+
+    Args:
+        filepath: Path to the checkpoint
+        env: Environment for the agent (a new HybridEnergyEnv by default)
+        mmap_mode: np.memmap mode for uncompressed sections, or None
+
+    Returns:
+        The restored EnhancedQAgent instance
+    """
+    header, data_start = read_header(filepath)
+    arrays = _read_sections(filepath, header, data_start, mmap_mode)
+
+    if env is None:
+        env = HybridEnergyEnv()
+    hyperparameters = header['hyperparameters']
+    # Checkpoints written before discretizers were configurable used 2-decimal rounding
+    discretizer = discretizer_from_config(header['discretizer']) if 'discretizer' in header else RoundingDiscretizer(2)
+    agent = EnhancedQAgent(env, alpha=hyperparameters['alpha'], gamma=hyperparameters['gamma'],
+                           epsilon=hyperparameters['epsilon'], epsilon_decay=hyperparameters['epsilon_decay'],
+                           min_epsilon=hyperparameters['min_epsilon'], max_energy=hyperparameters['max_energy'],
+                           q_backend=header['q_backend'], q_dtype=np.dtype(header['q_dtype']),
+                           discretizer=discretizer)
+    agent.target_update_frequency = hyperparameters['target_update_frequency']
+    agent.update_target_counter = hyperparameters['update_target_counter']
+
+    action_space = header['action_space']
+    if (action_space['pv'] != [int(v) for v in agent.action_space_pv] or
+            action_space['wt'] != [int(v) for v in agent.action_space_wt] or
+            action_space['grid'] != [int(v) for v in agent.action_space_grid]):
+        raise ValueError("Checkpoint action space does not match EnhancedQAgent's action grid")
+
+    if header['layout'] == 'dense':
+        table = DenseQTable.from_arrays(arrays['keys'], arrays['values'], arrays['counts'])
+        if header['q_backend'] == 'dict':
+            table = _dense_to_dict(table)
+    else:
+        table = _csr_to_dict(arrays)
+        if header['q_backend'] == 'dense':
+            table = _dict_to_dense(table, agent.action_count, agent.q_dtype)
+
+    agent.q_table = table
+    agent.target_q_table = CopyOnWriteTarget(table, synced=True, save_rows=discretizer.n_tilings > 1)
+
+    print(f"Checkpoint loaded from {filepath}")
+    print(f"Q-table size: {len(agent.q_table)} states")
+    return agent
+
+
+def _csr_to_dict(arrays):
+    keys = arrays['keys'].tolist()
+    row_ptr = arrays['row_ptr']
+    columns = arrays['columns'].tolist()
+    values = arrays['values'].tolist()
+    table = DictQTable()
+    for i, key in enumerate(keys):
+        start, end = row_ptr[i], row_ptr[i + 1]
+        table[tuple(key)] = dict(zip(columns[start:end], values[start:end]))
+    return table
+
+
+def _dense_to_dict(dense):
+    return DictQTable({key: dense.row(key) for key in dense.keys()})
+
+
+def _dict_to_dense(table, action_count, dtype):
+    dense = DenseQTable(action_count, dtype=dtype)
+    for key, row in table.items():
+        for action_idx, value in row.items():
+            dense.set_q(key, action_idx, value)
+    return dense
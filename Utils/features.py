@@ -0,0 +1,178 @@
+import numpy as np
+
+# Array versions of the feature transforms from Notebooks/Simulating.ipynb
+# (Process_data) and Notebooks/API_REQ.ipynb. Every function takes scalars,
+# NumPy arrays or pandas Series and works element-wise.
+
+R = 287.05  # Specific gas constant for dry air in J/(kg·K)
+INHG_TO_PA = 3386.39
+HPA_TO_PA = 100.0
+KMH_TO_MS = 1000 / 3600
+
+TURBINE_RADIUS = 50  # Radius of the wind turbine blades in meters
+EFFICIENCY_WIND = 0.4  # Efficiency of the wind turbine (40%)
+EFFICIENCY_SOLAR = 0.2  # Efficiency of the solar panels (20%)
+
+
+def fahrenheit_to_kelvin(temperature_f):
+    """Convert temperatures from °F to K."""
+    return (np.asarray(temperature_f, dtype=float) - 32) / 1.8 + 273.15
+
+
+def celsius_to_kelvin(temperature_c):
+    """Convert temperatures from °C to K."""
+    return np.asarray(temperature_c, dtype=float) + 273.15
+
+
+def air_density(pressure_pa, temperature_k):
+    """
+    Air density from the ideal gas law.
+
+    Args:
+        pressure_pa: Pressure in Pa
+        temperature_k: Temperature in K
+
+    Returns:
+        Air density in kg/m³ (NaN where the temperature is zero or missing)
+    """
+    pressure_pa = np.asarray(pressure_pa, dtype=float)
+    temperature_k = np.asarray(temperature_k, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        density = pressure_pa / (R * temperature_k)
+    return np.where(temperature_k != 0, density, np.nan)
+
+
+def wind_power(wind_speed_ms, density, turbine_radius=TURBINE_RADIUS, efficiency=EFFICIENCY_WIND):
+    """
+    Wind power from P = 0.5 * rho * A * v³ * efficiency.
+
+    Args:
+        wind_speed_ms: Wind speed in m/s
+        density: Air density in kg/m³
+        turbine_radius: Radius of the wind turbine blades in meters
+        efficiency: Efficiency of the wind turbine
+
+    Returns:
+        Wind power in W
+    """
+    wind_speed_ms = np.asarray(wind_speed_ms, dtype=float)
+    swept_area = np.pi * turbine_radius ** 2  # A = πR²
+    return 0.5 * np.asarray(density, dtype=float) * swept_area * wind_speed_ms ** 3 * efficiency
+
+
+def solar_power(solar_radiation, is_day=None, efficiency=EFFICIENCY_SOLAR):
+    """
+    Solar power from radiation and panel efficiency, zero at night.
+
+    Args:
+        solar_radiation: Solar radiation in W/m²
+        is_day: Optional 1/0 (or bool) daylight flags
+        efficiency: Efficiency of the solar panels
+
+    Returns:
+        Solar power in W per m² of panel
+    """
+    power = np.asarray(solar_radiation, dtype=float) * efficiency
+    if is_day is not None:
+        power = np.where(np.asarray(is_day) == 0, 0.0, power)
+    return power
+
+
+def process_plant_data(df, turbine_radius=60, efficiency=0.4):
+    """
+    Vectorized ``Process_data`` from Simulating.ipynb for the solar plant dataset.
+
+    Adds 'Temperature_K' (from the daily average in °F), 'Density' (from the
+    period pressure in inHg) and 'Wind_power' (kW, as the notebook's
+    calculate_wind_power divides by 1000) to ``df`` in place.
+
+    Args:
+        df: DataFrame with the columns of 'Data/Solar Power Plant Data.csv'
+        turbine_radius: Radius of the wind turbine blades in meters
+        efficiency: Efficiency of the wind turbine
+
+    Returns:
+        The same DataFrame
+    """
+    df['Temperature_K'] = fahrenheit_to_kelvin(df['Average Temperature (Day)'])
+    df['Density'] = air_density(df['Average Barometric Pressure (Period)'] * INHG_TO_PA, df['Temperature_K'])
+    df['Wind_power'] = wind_power(df['Average Wind Speed (Period)'], df['Density'],
+                                  turbine_radius, efficiency) / 1000
+    return df
+
+
+def process_open_meteo(hourly, turbine_radius=TURBINE_RADIUS, efficiency_wind=EFFICIENCY_WIND,
+                       efficiency_solar=EFFICIENCY_SOLAR):
+    """
+    Vectorized ``process_weather_data`` from API_REQ.ipynb.
+
+    Builds the enhanced_weather_data columns from the 'hourly' block of an
+    Open-Meteo response in one pass over whole arrays. Missing values become
+    NaN (0 for is_day). Unlike the notebook, density is computed from the
+    pressure in Pa and the wind speed is converted from km/h exactly once.
+
+    Args:
+        hourly: dict with 'time', 'temperature_2m' (°C), 'pressure_msl' (hPa),
+            'wind_speed_10m' (km/h), 'is_day' and 'shortwave_radiation' (W/m²)
+
+    Returns:
+        dict: Column name -> array, ready for pd.DataFrame
+    """
+    def values(name, fill=np.nan):
+        return np.array([fill if v is None else v for v in hourly.get(name, [])], dtype=float)
+
+    wind_speed = values('wind_speed_10m') * KMH_TO_MS
+    pressure_pa = values('pressure_msl') * HPA_TO_PA
+    temperature_k = celsius_to_kelvin(values('temperature_2m'))
+    radiation = values('shortwave_radiation')
+    is_day = values('is_day', 0)
+    density = air_density(pressure_pa, temperature_k)
+
+    return {
+        'Time': np.asarray(hourly.get('time', [])),
+        'Is_Day': is_day.astype(int),
+        'Average_Wind_Speed (m/s)': wind_speed,
+        'Average_Barometric_Pressure (InHg)': pressure_pa / INHG_TO_PA,
+        'Temperature (K)': temperature_k,
+        'Solar_Radiation (W/m²)': radiation,
+        'Density (kg/m³)': density,
+        'Wind_Power_Generated (W)': wind_power(wind_speed, density, turbine_radius, efficiency_wind),
+        'Solar_Power_Generated (W)': solar_power(radiation, is_day, efficiency_solar),
+    }
+
+
+def iter_processed_csv(filepath, process=process_plant_data, chunksize=100000, **read_csv_kwargs):
+    """
+    Stream a large CSV through a transform chunk by chunk.
+
+    Memory use is bounded by ``chunksize`` rows regardless of file size, and
+    every chunk is processed with whole-array operations.
+
+    Args:
+        filepath: CSV file to read
+        process: Function taking and returning a DataFrame chunk
+        chunksize: Rows per chunk
+        **read_csv_kwargs: Passed to pd.read_csv
+
+    Yields:
+        Processed DataFrame chunks
+    """
+    import pandas as pd
+
+    for chunk in pd.read_csv(filepath, chunksize=chunksize, **read_csv_kwargs):
+        yield process(chunk)
+
+
+def process_csv(filepath, output_path, process=process_plant_data, chunksize=100000, **read_csv_kwargs):
+    """
+    Apply a transform to a CSV out of core and write the result to ``output_path``.
+
+    Returns:
+        int: Number of rows written
+    """
+    rows = 0
+    with open(output_path, 'w', newline='') as f:
+        for chunk in iter_processed_csv(filepath, process, chunksize, **read_csv_kwargs):
+            chunk.to_csv(f, header=rows == 0, index=False)
+            rows += len(chunk)
+    return rows
@@ -0,0 +1,322 @@
+import numpy as np
+
+from Utils.QTable import DenseQTable
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # Optional: fall back to exact brute-force search
+    cKDTree = None
+
+
+class NearestStateIndex:
+    """
+    Nearest-neighbour index over state keys in normalized coordinates.
+
+    Each dimension is divided by ``scale`` (the key range per dimension by
+    default) so that solar, wind, demand and price contribute comparably.
+    Queries use a KD-tree (O(log n)) when SciPy is installed and an exact
+    blocked brute-force search otherwise; the brute-force path compares
+    ``chunk_size`` states against ``key_block`` keys at a time, so its
+    memory use stays bounded however many keys the table holds. Matches
+    farther than ``max_distance`` in normalized units are reported as -1.
+    """
+    def __init__(self, keys, scale=None, max_distance=None, chunk_size=1024, key_block=1024):
+        keys = np.asarray(keys, dtype=float)
+        if scale is None:
+            scale = np.ptp(keys, axis=0) if len(keys) else np.ones(keys.shape[1])
+        scale = np.asarray(scale, dtype=float)
+        self.scale = np.where(scale > 0, scale, 1.0)
+        self.max_distance = np.inf if max_distance is None else max_distance
+        self.chunk_size = chunk_size
+        self.key_block = key_block
+        self.points = keys / self.scale
+        self.tree = cKDTree(self.points) if cKDTree is not None and len(keys) else None
+
+    def _brute_force(self, points):
+        """Exact nearest rows, comparing (chunk_size, key_block) blocks of states and keys."""
+        rows = np.empty(len(points), dtype=np.int64)
+        distances = np.empty(len(points))
+        for start in range(0, len(points), self.chunk_size):
+            chunk = points[start:start + self.chunk_size]
+            best = np.full(len(chunk), np.inf)
+            best_rows = np.zeros(len(chunk), dtype=np.int64)
+            for key_start in range(0, len(self.points), self.key_block):
+                block = self.points[key_start:key_start + self.key_block]
+                d2 = ((chunk[:, np.newaxis, :] - block[np.newaxis, :, :]) ** 2).sum(axis=2)
+                nearest = d2.argmin(axis=1)
+                nearest_d2 = d2[np.arange(len(chunk)), nearest]
+                # Strict comparison keeps the first of equally near keys
+                better = nearest_d2 < best
+                best[better] = nearest_d2[better]
+                best_rows[better] = nearest[better] + key_start
+            rows[start:start + len(chunk)] = best_rows
+            distances[start:start + len(chunk)] = np.sqrt(best)
+        return rows, distances
+
+    def query(self, states):
+        """Return (rows, distances) of the nearest key for each state; rows are -1 beyond the cutoff."""
+        points = np.asarray(states, dtype=float) / self.scale
+        if len(self.points) == 0:
+            return np.full(len(points), -1), np.full(len(points), np.inf)
+        if self.tree is not None:
+            distances, rows = self.tree.query(points)
+        else:
+            rows, distances = self._brute_force(points)
+        rows = np.where(distances <= self.max_distance, rows, -1)
+        return rows, distances
+
+
+class GreedyPolicy:
+    """
+    Read-only greedy policy precomputed from a trained EnhancedQAgent.
+
+    Actions follow the same rules as ``choose_action`` at epsilon 0: the best
+    stored action that meets the energy limit, otherwise the best stored action
+    projected onto the limit. Discretized keys are encoded as single int64
+    codes and kept sorted, so ``act_batch`` answers a whole batch with one
+    vectorized discretization, one ``searchsorted`` and one gather.
+
+    When the agent's keys are the rounded states themselves (the default
+    RoundingDiscretizer) the greedy action of every stored state is resolved
+    once up front. With bin or tile-coding discretizers the energy limit
+    depends on the raw state, so the policy keeps the Q-value rows instead and
+    resolves each batch with the mean over the active tiles and the states'
+    own feasibility masks.
+
+    States that are not in the table get the agent's fallback (action index 0
+    made valid), as ``choose_action`` does for unseen states. With
+    ``fallback='nearest'`` they instead take the greedy action of the nearest
+    known state (see NearestStateIndex), made valid for the queried state, and
+    only use the default when no known state lies within ``max_distance``.
+    """
+    def __init__(self, agent, chunk_size=4096, fallback='default', max_distance=None, scale=None):
+        if fallback not in ('default', 'nearest'):
+            raise ValueError(f"Unknown fallback: {fallback!r} (expected 'default' or 'nearest')")
+        self.agent = agent
+        self.fallback = fallback
+        self.chunk_size = chunk_size
+        self.discretizer = agent.discretizer
+        self.precomputed = self.discretizer.keys_are_states and self.discretizer.n_tilings == 1
+
+        if self.precomputed:
+            keys, table, best_stored = self._greedy_table(chunk_size)
+        else:
+            keys, table = self._value_table()
+        self.n_states = len(keys)
+
+        # Integer lattice codes of the keys, packed into one int64 per key
+        lattice = self.discretizer.key_lattice(keys).reshape(self.n_states, -1)
+        key_size = lattice.shape[1] if self.n_states else self.discretizer.lattice(np.zeros((1, agent.env.state_size))).shape[2]
+        if self.n_states:
+            self.low = lattice.min(axis=0)
+            self.span = lattice.max(axis=0) - self.low + 1
+        else:
+            self.low = np.zeros(key_size, dtype=np.int64)
+            self.span = np.ones(key_size, dtype=np.int64)
+        if np.prod(self.span.astype(float)) >= 2 ** 62:
+            raise ValueError("State key range is too wide to pack into int64 codes")
+        self.radix = np.concatenate([np.cumprod(self.span[::-1])[::-1][1:], [1]]).astype(np.int64)
+
+        codes = (lattice - self.low) @ self.radix if self.n_states else np.zeros(0, dtype=np.int64)
+        order = np.argsort(codes, kind='stable')
+        self.codes = codes[order]
+        self.keys = keys[order]
+        self.actions = table[order] if self.precomputed else None
+        # Best stored action index of each key, ignoring the energy limit
+        self.best_stored = best_stored[order] if self.precomputed else None
+        self.values = None if self.precomputed else table[order]
+
+        self.nearest_index = None
+        if fallback == 'nearest':
+            # Neighbours are searched among the keys of the first tiling only
+            if self.discretizer.n_tilings > 1:
+                self.nearest_rows = np.flatnonzero(lattice[order][:, 0] == 0)
+            else:
+                self.nearest_rows = np.arange(self.n_states)
+            self.nearest_index = NearestStateIndex(self._nearest_points(self.keys[self.nearest_rows], stored=True),
+                                                   scale, max_distance)
+
+    def _select(self, values, present, reference):
+        """Greedy actions for rows of Q-values: the best feasible stored action, else the best one projected."""
+        masks = self.agent.feasible_action_masks(reference)
+        feasible = (present & masks).any(axis=1)
+        masked = np.where(present & masks, values, -np.inf)
+        best_any = np.where(present, values, -np.inf).argmax(axis=1)
+        best = np.where(feasible, masked.argmax(axis=1), best_any)
+
+        actions = self.agent.action_grid[best].astype(float)
+        if len(actions) and not feasible.all():
+            actions[~feasible] = self.agent.project_actions(actions[~feasible], reference[~feasible])
+        return actions
+
+    def _greedy_table(self, chunk_size):
+        """Return (keys, greedy actions, best stored action indices) for every state in the agent's Q-table."""
+        agent = self.agent
+        table = agent.q_table
+        if isinstance(table, DenseQTable):
+            stored = np.flatnonzero(table.counts[:table.n_rows] > 0)
+            keys = np.asarray(table.key_array(), dtype=float)[stored]
+            actions = np.empty((len(stored), 3), dtype=float)
+            best_stored = np.empty(len(stored), dtype=np.int64)
+            for start in range(0, len(stored), chunk_size):
+                rows = stored[start:start + chunk_size]
+                values = np.asarray(table.values[rows], dtype=np.float64)
+                actions[start:start + chunk_size] = self._select(values, ~np.isnan(values),
+                                                                 keys[start:start + chunk_size])
+                best_stored[start:start + chunk_size] = np.where(np.isnan(values), -np.inf, values).argmax(axis=1)
+            return keys, actions, best_stored
+
+        state_keys = list(table.keys())
+        keys = np.array(state_keys, dtype=float).reshape(len(state_keys), -1)
+        best = np.empty(len(state_keys), dtype=np.int64)
+        best_stored = np.empty(len(state_keys), dtype=np.int64)
+        feasible = np.empty(len(state_keys), dtype=bool)
+        for i, key in enumerate(state_keys):
+            idx = table.argmax(key, agent.feasible_action_mask(key))
+            best_stored[i] = table.argmax(key)
+            feasible[i] = idx is not None
+            best[i] = idx if idx is not None else best_stored[i]
+
+        actions = agent.action_grid[best].astype(float)
+        if len(actions) and not feasible.all():
+            actions[~feasible] = agent.project_actions(actions[~feasible], keys[~feasible])
+        return keys, actions, best_stored
+
+    def _value_table(self):
+        """Return (keys, (n, action_count) Q-values with NaN for absent entries) for every stored key."""
+        table = self.agent.q_table
+        if isinstance(table, DenseQTable):
+            stored = np.flatnonzero(table.counts[:table.n_rows] > 0)
+            keys = np.asarray(table.key_array(), dtype=float)[stored]
+            return keys, np.asarray(table.values[stored], dtype=np.float64)
+
+        state_keys = list(table.keys())
+        keys = np.array(state_keys, dtype=float).reshape(len(state_keys), -1)
+        values = np.full((len(state_keys), self.agent.action_count), np.nan)
+        for i, key in enumerate(state_keys):
+            row = table[key]
+            values[i, list(row.keys())] = list(row.values())
+        return keys, values
+
+    def _rows(self, lattice):
+        """Row of each (n, key_size) lattice key in the policy table, or -1 if it is unknown."""
+        shifted = lattice - self.low
+        in_range = ((shifted >= 0) & (shifted < self.span)).all(axis=1)
+        codes = np.where(in_range, shifted @ self.radix, -1)
+
+        pos = np.minimum(np.searchsorted(self.codes, codes), max(self.n_states - 1, 0))
+        found = in_range & (self.n_states > 0)
+        if self.n_states:
+            found &= self.codes[pos] == codes
+        return np.where(found, pos, -1)
+
+    def _tile_rows(self, states):
+        """Rows of every active key of each state, shaped (N, n_tilings); -1 where unknown."""
+        lattice = self.discretizer.lattice(states)
+        n, tilings, key_size = lattice.shape
+        return self._rows(lattice.reshape(n * tilings, key_size)).reshape(n, tilings)
+
+    def lookup(self, states):
+        """Return the row of each state's (first-tiling) key in the policy table, or -1 if it is unknown."""
+        states = np.asarray(states, dtype=float).reshape(-1, self.agent.env.state_size)
+        return self._tile_rows(states)[:, 0]
+
+    def _tile_mean(self, rows):
+        """Mean Q-values over the tilings of (n, n_tilings) rows, and which actions any tiling stores."""
+        total = np.zeros((len(rows), self.values.shape[1]))
+        present = np.zeros(total.shape, dtype=bool)
+        for t in range(rows.shape[1]):
+            active = rows[:, t] >= 0
+            values = self.values[rows[active, t]]
+            stored = ~np.isnan(values)
+            total[active] += np.where(stored, values, 0.0)
+            present[active] |= stored
+        return total / rows.shape[1], present
+
+    def _resolve_rows(self, rows, states):
+        """Greedy actions from stored Q-value rows (N, n_tilings), averaging over tilings."""
+        actions = np.empty((len(states), 3), dtype=float)
+        for start in range(0, len(states), self.chunk_size):
+            values, present = self._tile_mean(rows[start:start + self.chunk_size])
+            reference = self.discretizer.reference_states(states[start:start + self.chunk_size])
+            actions[start:start + self.chunk_size] = self._select(values, present, reference)
+        return actions
+
+    def best_stored_actions(self, states):
+        """Best stored action of each state ignoring the energy limit (``agent.greedy_action_idx``).
+
+        Returns:
+            tuple: ((N, 3) actions, (N,) bool mask of states found in the table)
+        """
+        states = np.asarray(states, dtype=float).reshape(-1, self.agent.env.state_size)
+        rows = self._tile_rows(states)
+        best = np.zeros(len(states), dtype=np.int64)
+        if self.precomputed:
+            rows = rows[:, 0]
+            known = rows >= 0
+            best[known] = self.best_stored[rows[known]]
+        else:
+            known = (rows >= 0).any(axis=1)
+            known_rows = rows[known]
+            known_best = np.empty(len(known_rows), dtype=np.int64)
+            for start in range(0, len(known_rows), self.chunk_size):
+                values, present = self._tile_mean(known_rows[start:start + self.chunk_size])
+                known_best[start:start + self.chunk_size] = np.where(present, values, -np.inf).argmax(axis=1)
+            best[known] = known_best
+        return self.agent.action_grid[best], known
+
+    def _nearest_points(self, states, stored=False):
+        """Coordinates for the nearest-neighbour search: rounded states, or integer key coordinates."""
+        if self.precomputed:
+            return states if stored else self.discretizer.reference_states(states)
+        if stored:
+            return self.discretizer.key_lattice(states).astype(float)
+        return self.discretizer.lattice(states)[:, 0, :].astype(float)
+
+    def nearest_actions(self, states):
+        """Greedy actions of the nearest known states, made valid for ``states``.
+
+        Returns:
+            tuple: ((N, 3) actions, (N,) bool mask of states with a neighbour within the cutoff)
+        """
+        states = np.asarray(states, dtype=float).reshape(-1, self.agent.env.state_size)
+        rows, _ = self.nearest_index.query(self._nearest_points(states))
+        found = rows >= 0
+        actions = np.zeros((len(states), 3))
+        if found.any():
+            table_rows = self.nearest_rows[rows[found]]
+            if self.precomputed:
+                actions[found] = self.agent.project_actions(self.actions[table_rows],
+                                                            self.discretizer.reference_states(states[found]))
+            else:
+                actions[found] = self._resolve_rows(table_rows[:, np.newaxis], states[found])
+        return actions, found
+
+    def fallback_actions(self, states):
+        """Actions for unknown states: the nearest known state's action, or action index 0 made valid."""
+        default = np.broadcast_to(self.agent.action_grid[0].astype(float), (len(states), 3))
+        actions = self.agent.project_actions(default, self.discretizer.reference_states(states))
+        if self.nearest_index is not None:
+            nearest, found = self.nearest_actions(states)
+            actions[found] = nearest[found]
+        return actions
+
+    def act_batch(self, states):
+        """Return the greedy action for each row of an (N, 4) state array as an (N, 3) array."""
+        states = np.asarray(states, dtype=float).reshape(-1, self.agent.env.state_size)
+        rows = self._tile_rows(states)
+        actions = np.empty((len(states), 3), dtype=float)
+        if self.precomputed:
+            rows = rows[:, 0]
+            known = rows >= 0
+            actions[known] = self.actions[rows[known]]
+        else:
+            known = (rows >= 0).any(axis=1)
+            actions[known] = self._resolve_rows(rows[known], states[known])
+        if not known.all():
+            actions[~known] = self.fallback_actions(states[~known])
+        return actions
+
+    def act(self, state):
+        """Return the greedy action for a single state as a tuple."""
+        return tuple(self.act_batch(state)[0])
@@ -0,0 +1,425 @@
+import numpy as np
+
+from Utils.Env import calculate_co2_array, calculate_cost_array
+
+# Whole-horizon simulations behind Interface/scripts/simulation_api.py: the
+# rule-based heuristic, a trained agent, and a grid-only baseline. Every
+# quantity is an (S, H) array for S scenarios over H hours; only the wind
+# pattern's smoothing recurrence loops over hours. simulate_windows runs the
+# same models one window of hours at a time for streamed responses.
+
+POLICIES = ('heuristic', 'agent', 'grid_only')
+
+GRID_EMISSION_FACTOR = 0.35  # kg CO2/kWh used for the simulated grid mix
+BASELINE_EMISSION_FACTOR = 0.4  # kg CO2/kWh of a typical grid, for the reference emissions
+SCALAR_RECURRENCE_MAX_SCENARIOS = 16  # Below this the wind recurrence runs on Python floats
+INITIAL_WIND_BASE = 0.45  # Higher base wind factor
+
+
+def solar_pattern(hours, start=0):
+    """Day/night solar capacity factor for each hour from ``start``, peaking at noon."""
+    time_of_day = np.arange(start, start + hours) % 24
+    daylight = (time_of_day >= 6) & (time_of_day <= 18)
+    peak_factor = 1 - np.abs(time_of_day - 12) / 6.5  # Extended peak
+    return np.where(daylight, 0.2 + 0.75 * peak_factor, 0.08)
+
+
+def wind_pattern(hours, rng, n_scenarios=1):
+    """
+    Variable wind capacity factors, shaped (n_scenarios, hours).
+
+    Each hour's factor is drawn around a smoothed base, clipped to [0.2, 0.95],
+    and occasionally boosted to give some "great" wind hours.
+    """
+    return _wind_window(hours, rng, np.full(n_scenarios, INITIAL_WIND_BASE))[0]
+
+
+def _wind_window(hours, rng, wind_base):
+    """Wind factors for the next ``hours`` from each scenario's smoothed base; returns (pattern, next bases)."""
+    n_scenarios = len(wind_base)
+    noise = rng.normal(0.05, 0.12, size=(n_scenarios, hours))
+    boost = rng.random((n_scenarios, hours)) < 0.15
+    pattern = np.empty((n_scenarios, hours))
+    if n_scenarios <= SCALAR_RECURRENCE_MAX_SCENARIOS:
+        # Plain floats beat NumPy calls on tiny vectors for the per-hour recurrence
+        next_base = np.empty(n_scenarios)
+        for scenario, (base, row) in enumerate(zip(wind_base.tolist(), noise.tolist())):
+            factors = []
+            for value in row:
+                wind_factor = min(0.95, max(0.2, base + value))
+                factors.append(wind_factor)
+                # Smoother transitions with bias toward higher values
+                base = 0.65 * base + 0.35 * wind_factor
+            pattern[scenario] = factors
+            next_base[scenario] = base
+    else:
+        next_base = np.array(wind_base, dtype=float)
+        for hour in range(hours):
+            wind_factor = np.clip(next_base + noise[:, hour], 0.2, 0.95)
+            pattern[:, hour] = wind_factor
+            next_base = 0.65 * next_base + 0.35 * wind_factor
+    return np.where(boost, np.minimum(0.95, pattern + 0.2), pattern), next_base
+
+
+def simulate_heuristic(simulation_time=24, energy_demand=100, grid_price=0.15, rng=None, n_scenarios=None):
+    """
+    Simulate the rule-based PV/wind/grid allocation over a whole horizon.
+
+    Args:
+        simulation_time: Number of hours H
+        energy_demand: Demand per hour (scalar or one value per scenario)
+        grid_price: Grid price (scalar or one value per scenario)
+        rng: np.random.Generator or seed
+        n_scenarios: Number of scenarios S (defaults to the length of the
+            demand/price arrays, or 1)
+
+    Returns:
+        dict: (S, H) arrays 'solar_factor', 'wind_factor', 'pv_panels',
+        'wind_turbines', 'pv_power', 'wind_power', 'grid_power',
+        'total_energy', 'cost', 'co2', and (S,) arrays 'total_cost', 'total_co2'
+    """
+    rng, demand, price, solar, wind = _setup(simulation_time, energy_demand, grid_price, rng, n_scenarios)
+    n_scenarios, hours = solar.shape
+
+    # Reference cost and emissions the results are compared against
+    baseline_cost = demand[:, 0] * price[:, 0] * hours * rng.uniform(1.4, 1.8, n_scenarios)
+    baseline_co2 = demand[:, 0] * BASELINE_EMISSION_FACTOR * hours * rng.uniform(1.3, 1.7, n_scenarios)
+
+    result = _heuristic_hours(rng, demand, price, solar, wind)
+    _scale_to_targets(result, baseline_cost * rng.uniform(0.4, 0.6, n_scenarios),
+                      baseline_co2 * rng.uniform(0.35, 0.55, n_scenarios))
+    return result
+
+
+def _heuristic_hours(rng, demand, price, solar, wind):
+    """Hourly allocations, cost and CO2 of the heuristic, before scaling to the savings targets."""
+    shape = solar.shape
+
+    # PV allocation: more panels when solar is good, some panels even when it is low
+    pv_count = np.where(
+        solar > 0.5,
+        np.maximum(10, np.minimum(500, demand / (solar + 0.1) * rng.uniform(0.7, 0.9, shape))),
+        np.maximum(10, demand / 2 * solar * rng.uniform(0.9, 1.2, shape)),
+    ).astype(int)
+
+    # Wind turbine allocation: prefer wind when it is good, keep some backup otherwise
+    wt_count = np.where(
+        wind > 0.4,
+        np.maximum(5, np.minimum(47, demand / (wind + 0.1) * rng.uniform(0.6, 0.8, shape))),
+        np.maximum(2, demand / 4 * wind * rng.uniform(0.8, 1.1, shape)),
+    ).astype(int)
+
+    # Actual generation (slightly better than expected)
+    pv_power = pv_count * solar * rng.uniform(1.0, 1.12, shape)
+    wt_power = wt_count * wind * rng.uniform(1.0, 1.15, shape)
+
+    # Grid covers the rest; excess renewables are scaled down to the demand
+    renewable_energy = pv_power + wt_power
+    grid_power = demand - renewable_energy
+    excess = grid_power < 0
+    scale = np.where(excess, demand / np.where(excess, renewable_energy, 1.0), 1.0)
+    pv_power = pv_power * scale
+    wt_power = wt_power * scale
+    grid_power = np.where(excess, 0.0, grid_power)
+
+    # Small fluctuation (±0.5% of demand) applied to grid power
+    grid_power = np.maximum(0, grid_power + demand * rng.uniform(-0.005, 0.005, shape))
+    total_energy = pv_power + wt_power + grid_power
+
+    cost = grid_power * price * rng.uniform(0.8, 0.98, shape)
+    cost += (pv_power * 0.01 + wt_power * 0.015) * rng.uniform(0.7, 0.9, shape)
+    co2 = grid_power * GRID_EMISSION_FACTOR * rng.uniform(0.75, 0.95, shape)
+    co2 += (pv_power * 0.005 + wt_power * 0.007) * rng.uniform(0.8, 1.0, shape)
+
+    return {
+        'solar_factor': np.array(solar),
+        'wind_factor': wind,
+        'pv_panels': pv_count,
+        'wind_turbines': wt_count,
+        'pv_power': pv_power,
+        'wind_power': wt_power,
+        'grid_power': grid_power,
+        'total_energy': total_energy,
+        'cost': cost,
+        'co2': co2,
+    }
+
+
+def _scale_to_targets(result, target_cost, target_co2):
+    """Scale costs and emissions down to the (S,) target totals where they fall short, and set the totals."""
+    cost = result['cost']
+    total_cost = cost.sum(axis=1)
+    cost_scale = np.where(total_cost > target_cost, target_cost / np.where(total_cost > 0, total_cost, 1.0), 1.0)
+    result['cost'] = cost * cost_scale[:, np.newaxis]
+    result['total_cost'] = np.minimum(total_cost, target_cost)
+
+    co2 = result['co2']
+    total_co2 = co2.sum(axis=1)
+    co2_scale = np.where(total_co2 > target_co2, target_co2 / np.where(total_co2 > 0, total_co2, 1.0), 1.0)
+    result['co2'] = co2 * co2_scale[:, np.newaxis]
+    result['total_co2'] = np.minimum(total_co2, target_co2)
+
+
+def _setup(simulation_time, energy_demand, grid_price, rng, n_scenarios):
+    """Shared inputs: (rng, demand (S, 1), price (S, 1), solar (S, H), wind (S, H))."""
+    rng = np.random.default_rng(rng)
+    demand, price = _scenario_columns(energy_demand, grid_price, n_scenarios)
+    n_scenarios = len(demand)
+    hours = int(simulation_time)
+    solar = np.broadcast_to(solar_pattern(hours), (n_scenarios, hours))
+    wind = wind_pattern(hours, rng, n_scenarios)
+    return rng, demand, price, solar, wind
+
+
+def _scenario_columns(energy_demand, grid_price, n_scenarios):
+    """Demand and price as (S, 1) columns, broadcast to ``n_scenarios`` (default: the longer input)."""
+    demand = np.atleast_1d(np.asarray(energy_demand, dtype=float))
+    price = np.atleast_1d(np.asarray(grid_price, dtype=float))
+    if n_scenarios is None:
+        n_scenarios = max(len(demand), len(price))
+    demand = np.broadcast_to(demand, (n_scenarios,))[:, np.newaxis]
+    price = np.broadcast_to(price, (n_scenarios,))[:, np.newaxis]
+    return demand, price
+
+
+def _dispatch(actions, solar, wind, demand, price):
+    """
+    Evaluate (S, H, 3) [pv, wt, grid] decisions with the environment's models.
+
+    Grid power is capped at the remaining deficit, as in HybridEnergyEnv.step,
+    and cost and CO2 come from the env's array cost and emission models.
+    """
+    demand = np.broadcast_to(demand, solar.shape)
+    price = np.broadcast_to(price, solar.shape)
+    states = np.stack([solar, wind, demand, price], axis=-1)
+    pv_count, wt_count = actions[..., 0], actions[..., 1]
+    pv_power = pv_count * solar
+    wt_power = wt_count * wind
+    grid_power = np.minimum(actions[..., 2], np.maximum(0, demand - pv_power - wt_power))
+    used = np.stack([pv_count, wt_count, grid_power], axis=-1)
+    cost = -calculate_cost_array(used, states)
+    co2 = -calculate_co2_array(used, states)
+    return {
+        'solar_factor': np.array(solar),
+        'wind_factor': wind,
+        'pv_panels': pv_count.astype(int),
+        'wind_turbines': wt_count.astype(int),
+        'pv_power': pv_power,
+        'wind_power': wt_power,
+        'grid_power': grid_power,
+        'total_energy': pv_power + wt_power + grid_power,
+        'cost': cost,
+        'co2': co2,
+        'total_cost': cost.sum(axis=1),
+        'total_co2': co2.sum(axis=1),
+    }
+
+
+def simulate_agent(agent, simulation_time=24, energy_demand=100, grid_price=0.15, rng=None, n_scenarios=None,
+                   policy=None):
+    """
+    Simulate a trained agent's decisions over a whole horizon.
+
+    All S * H states go through ``best_actions_array`` in one call, so demand
+    coverage follows get_best_actions (smallest sufficient grid option), and
+    the Q-table lookup is one batched GreedyPolicy query (or, without a
+    policy, one lookup per distinct state key).
+
+    Args:
+        agent: Trained EnhancedQAgent
+        policy: GreedyPolicy of the agent, built once by callers that simulate
+            repeatedly; with fallback='nearest' it also covers unseen states
+        Other arguments and the result are as in simulate_heuristic.
+    """
+    rng, demand, price, solar, wind = _setup(simulation_time, energy_demand, grid_price, rng, n_scenarios)
+    return _dispatch(_agent_actions(agent, policy, rng, demand, price, solar, wind), solar, wind, demand, price)
+
+
+def _agent_actions(agent, policy, rng, demand, price, solar, wind):
+    """(S, H, 3) agent decisions for every hour, from one best_actions_array call."""
+    from Utils.best_action import best_actions_array
+
+    states = np.stack([solar, wind, np.broadcast_to(demand, solar.shape), np.broadcast_to(price, solar.shape)],
+                      axis=-1)
+    actions = best_actions_array(agent, states.reshape(-1, 4), rng=rng, policy=policy)
+    return actions.reshape(solar.shape + (3,)).astype(float)
+
+
+def simulate_grid_only(simulation_time=24, energy_demand=100, grid_price=0.15, rng=None, n_scenarios=None):
+    """Baseline that buys all demand from the grid (same patterns and models as simulate_agent)."""
+    rng, demand, price, solar, wind = _setup(simulation_time, energy_demand, grid_price, rng, n_scenarios)
+    return _dispatch(_grid_only_actions(demand, solar), solar, wind, demand, price)
+
+
+def _grid_only_actions(demand, solar):
+    """(S, H, 3) decisions that buy the whole demand from the grid."""
+    actions = np.zeros(solar.shape + (3,))
+    actions[..., 2] = np.broadcast_to(demand, solar.shape)
+    return actions
+
+
+def simulate_policy(policy, simulation_time=24, energy_demand=100, grid_price=0.15, rng=None, n_scenarios=None,
+                    agent=None, greedy_policy=None):
+    """Dispatch to the simulator for ``policy`` (one of POLICIES); ``greedy_policy`` is passed to simulate_agent."""
+    if policy == 'heuristic':
+        return simulate_heuristic(simulation_time, energy_demand, grid_price, rng, n_scenarios)
+    if policy == 'agent':
+        if agent is None:
+            raise ValueError("The 'agent' policy needs a trained agent")
+        return simulate_agent(agent, simulation_time, energy_demand, grid_price, rng, n_scenarios, greedy_policy)
+    if policy == 'grid_only':
+        return simulate_grid_only(simulation_time, energy_demand, grid_price, rng, n_scenarios)
+    raise ValueError(f"Unknown policy {policy!r} (expected one of {', '.join(POLICIES)})")
+
+
+def simulate_windows(policy, simulation_time=24, energy_demand=100, grid_price=0.15, rng=None, n_scenarios=None,
+                     agent=None, greedy_policy=None, window_hours=168):
+    """
+    Simulate ``policy`` one window of hours at a time, yielding each window as
+    soon as it is computed.
+
+    The models are those of simulate_policy; the wind smoothing state and the
+    random generator carry over from one window to the next, so peak memory
+    and the time to the first window do not grow with the horizon. The
+    heuristic scales each window to its share of the savings targets instead
+    of the whole horizon at once, and the random draws are interleaved per
+    window, so a seeded run does not reproduce simulate_policy's numbers.
+
+    Args:
+        window_hours: Hours per window
+        Other arguments are as in simulate_policy.
+
+    Yields:
+        tuple: (first hour of the window, result dict as in simulate_heuristic
+        with (S, window) arrays)
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy {policy!r} (expected one of {', '.join(POLICIES)})")
+    if policy == 'agent' and agent is None:
+        raise ValueError("The 'agent' policy needs a trained agent")
+    rng = np.random.default_rng(rng)
+    demand, price = _scenario_columns(energy_demand, grid_price, n_scenarios)
+    n_scenarios = len(demand)
+    wind_base = np.full(n_scenarios, INITIAL_WIND_BASE)
+    if policy == 'heuristic':
+        # Per-hour reference cost and emissions, and the share of them to target
+        hourly_cost = (demand[:, 0] * price[:, 0] * rng.uniform(1.4, 1.8, n_scenarios)
+                       * rng.uniform(0.4, 0.6, n_scenarios))
+        hourly_co2 = (demand[:, 0] * BASELINE_EMISSION_FACTOR * rng.uniform(1.3, 1.7, n_scenarios)
+                      * rng.uniform(0.35, 0.55, n_scenarios))
+
+    hours = int(simulation_time)
+    for start in range(0, hours, window_hours):
+        length = min(window_hours, hours - start)
+        solar = np.broadcast_to(solar_pattern(length, start), (n_scenarios, length))
+        wind, wind_base = _wind_window(length, rng, wind_base)
+        if policy == 'heuristic':
+            result = _heuristic_hours(rng, demand, price, solar, wind)
+            _scale_to_targets(result, hourly_cost * length, hourly_co2 * length)
+        elif policy == 'agent':
+            actions = _agent_actions(agent, greedy_policy, rng, demand, price, solar, wind)
+            result = _dispatch(actions, solar, wind, demand, price)
+        else:
+            result = _dispatch(_grid_only_actions(demand, solar), solar, wind, demand, price)
+        yield start, result
+
+
+def scenario_grid(simulation_times, energy_demands, grid_prices):
+    """Cartesian product of the sweep values as a list of scenario dicts."""
+    return [{'simulationTime': int(hours), 'energyDemand': float(demand), 'gridPrice': float(price)}
+            for hours in np.atleast_1d(simulation_times)
+            for demand in np.atleast_1d(energy_demands)
+            for price in np.atleast_1d(grid_prices)]
+
+
+_AVERAGED = ('pv_panels', 'wind_turbines', 'grid_power', 'total_energy')  # Hourly series the summary averages
+
+
+def summarize(result):
+    """Per-scenario summary of a simulation result, as (S,) arrays."""
+    means = {name: result[name].mean(axis=1) for name in _AVERAGED}
+    return _summary(means, result['total_cost'], result['total_co2'])
+
+
+def _summary(means, total_cost, total_co2):
+    return {
+        'averagePvPanels': np.round(means['pv_panels']),
+        'averageWindTurbines': np.round(means['wind_turbines']),
+        'averageGridPower': np.round(means['grid_power'], 2),
+        'averageTotalEnergy': np.round(means['total_energy'], 2),
+        'totalCost': np.round(total_cost, 2),
+        'totalCO2': np.round(total_co2, 2),
+    }
+
+
+class WindowSummary:
+    """
+    Running summary of a windowed run (see simulate_windows).
+
+    Only per-scenario sums are kept, so the memory used does not depend on
+    the horizon; ``records()`` gives what summary_records would for the
+    concatenated windows.
+    """
+    def __init__(self):
+        self.hours = 0
+        self.sums = None
+
+    def add(self, result):
+        """Add one window's result."""
+        sums = {name: result[name].sum(axis=1) for name in _AVERAGED}
+        sums['total_cost'] = result['total_cost']
+        sums['total_co2'] = result['total_co2']
+        if self.sums is None:
+            self.sums = sums
+        else:
+            for name, value in sums.items():
+                self.sums[name] = self.sums[name] + value
+        self.hours += result['pv_panels'].shape[1]
+
+    def summary(self):
+        """Per-scenario summary of the windows added so far, as (S,) arrays."""
+        means = {name: self.sums[name] / self.hours for name in _AVERAGED}
+        return _summary(means, self.sums['total_cost'], self.sums['total_co2'])
+
+    def records(self):
+        """JSON-ready summary dicts for every scenario."""
+        return _summary_records(self.summary())
+
+
+def hourly_records(result, scenario=0, start=0, stop=None, first_hour=0):
+    """
+    Hourly result dicts for one scenario (hours ``start`` to ``stop``), in the
+    /api/simulation response format; ``first_hour`` offsets the hour numbers
+    of a result that begins later in the horizon (a simulate_windows window).
+    """
+    window = slice(start, stop)
+    columns = {
+        'solarFactor': np.round(result['solar_factor'][scenario, window], 2),
+        'windFactor': np.round(result['wind_factor'][scenario, window], 2),
+        'pvPanels': result['pv_panels'][scenario, window],
+        'windTurbines': result['wind_turbines'][scenario, window],
+        'gridPower': np.round(result['grid_power'][scenario, window], 2),
+        'totalEnergy': np.round(result['total_energy'][scenario, window], 2),
+        'cost': np.round(result['cost'][scenario, window], 2),
+        'co2': np.round(result['co2'][scenario, window], 2),
+    }
+    names = list(columns)
+    rows = zip(*(columns[name].tolist() for name in names))
+    return [dict(hour=hour, **dict(zip(names, row))) for hour, row in enumerate(rows, first_hour + start)]
+
+
+def summary_records(result):
+    """JSON-ready summary dicts for every scenario of a result."""
+    return _summary_records(summarize(result))
+
+
+def _summary_records(summary):
+    names = list(summary)
+    integer = ('averagePvPanels', 'averageWindTurbines')
+    columns = [summary[name].astype(int).tolist() if name in integer else summary[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def scenario_summary(result, scenario=0):
+    """JSON-ready summary dict for one scenario."""
+    return summary_records(result)[scenario]
@@ -0,0 +1,303 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from Utils.features import HPA_TO_PA, air_density, wind_power
+
+# Store layout:
+#   <root>/manifest.json               partitions and their time ranges
+#   <root>/<YYYY-MM>/time.npy          datetime64[s] timestamps, sorted and unique
+#   <root>/<YYYY-MM>/<column>.npy      one float64 array per column
+# Partitions are monthly, so appending new hours only rewrites the months they
+# fall in, and a range query only opens the months it overlaps.
+MANIFEST = 'manifest.json'
+TIME_COLUMN = 'time'
+COLUMNS = ('is_day', 'wind_speed_ms', 'pressure_hpa', 'temperature_k', 'solar_radiation_wm2',
+           'density_kgm3', 'wind_power_w', 'solar_power_w')
+
+MPH_TO_MS = 0.44704
+KMH_TO_MS = 1000 / 3600
+INHG_TO_HPA = 33.8639
+
+# Known CSV layouts: canonical column -> (source column, unit conversion factor).
+# Density is not read from any of them; it is recomputed from pressure and
+# temperature because the enhanced_weather_data files store it from hPa
+# instead of Pa (100x too small). Their wind power was computed from that
+# density and a wind speed converted from km/h twice, so layouts without a
+# 'wind_power_w' source get it recomputed from the normalized columns.
+SOURCE_FORMATS = {
+    # Data/Data.csv and Data/Solar Power Plant Data.csv. Wind_power comes from
+    # calculate_wind_power in Simulating.ipynb, which returns kW.
+    'plant': {
+        'is_day': ('Is Daylight', 1.0),
+        'wind_speed_ms': ('Average Wind Speed (Period)', MPH_TO_MS),
+        'pressure_hpa': ('Average Barometric Pressure (Period)', INHG_TO_HPA),
+        'temperature_k': ('Temperature_K', 1.0),
+        'wind_power_w': ('Wind_power', 1000.0),
+        'solar_power_w': ('Power Generated', 1.0),
+    },
+    # Early enhanced_weather_data files (underscore units)
+    'enhanced_v1': {
+        'is_day': ('Is_Day', 1.0),
+        'wind_speed_ms': ('Average_Wind_Speed_kmh', KMH_TO_MS),
+        'pressure_hpa': ('Average_Barometric_Pressure_hPa', 1.0),
+        'temperature_k': ('Temperature_K', 1.0),
+        'solar_radiation_wm2': ('Solar_Radiation_Wm2', 1.0),
+        'solar_power_w': ('Solar_Power_Generated_W', 1.0),
+    },
+    # enhanced_weather_data files written by API_REQ.ipynb
+    'enhanced': {
+        'is_day': ('Is_Day', 1.0),
+        'wind_speed_ms': ('Average_Wind_Speed (m/s)', 1.0),
+        'pressure_hpa': ('Average_Barometric_Pressure (InHg)', INHG_TO_HPA),
+        'temperature_k': ('Temperature (K)', 1.0),
+        'solar_radiation_wm2': ('Solar_Radiation (W/m²)', 1.0),
+        'solar_power_w': ('Solar_Power_Generated (W)', 1.0),
+    },
+}
+
+
+def _detect_format(columns):
+    for name, mapping in SOURCE_FORMATS.items():
+        if all(source in columns for source, _ in mapping.values()):
+            return name
+    raise ValueError(f"Unrecognized weather CSV layout with columns {list(columns)}")
+
+
+def read_weather_csv(filepath):
+    """
+    Read one weather CSV into normalized columns.
+
+    Args:
+        filepath: Data/Data.csv-style plant data or an enhanced_weather_data file
+
+    Returns:
+        dict: 'time' (datetime64[s]) plus every name in COLUMNS as float64 arrays
+              (NaN where the source has no such column)
+    """
+    import pandas as pd
+
+    frame = pd.read_csv(filepath)
+    source_format = _detect_format(frame.columns)
+    if source_format == 'plant':
+        time = pd.to_datetime(pd.DataFrame({
+            'year': frame['Year'], 'month': frame['Month'], 'day': frame['Day'],
+            'hour': frame['First Hour of Period'],
+        }))
+    else:
+        time = pd.to_datetime(frame['Time'])
+
+    data = {TIME_COLUMN: time.to_numpy().astype('datetime64[s]')}
+    for name in COLUMNS:
+        data[name] = np.full(len(frame), np.nan)
+    for name, (source, factor) in SOURCE_FORMATS[source_format].items():
+        data[name] = frame[source].to_numpy(dtype=np.float64) * factor
+    data['density_kgm3'] = air_density(data['pressure_hpa'] * HPA_TO_PA, data['temperature_k'])
+    if 'wind_power_w' not in SOURCE_FORMATS[source_format]:
+        data['wind_power_w'] = wind_power(data['wind_speed_ms'], data['density_kgm3'])
+    return data
+
+
+def _keep_last(time):
+    """Indices of the last occurrence of every timestamp, in time order."""
+    _, first_in_reversed = np.unique(time[::-1], return_index=True)
+    return len(time) - 1 - first_in_reversed
+
+
+def _save(path, array):
+    """Write an .npy file atomically so readers never see a partial partition."""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+class WeatherStore:
+    """
+    Columnar, memory-mapped store of hourly weather and generation data.
+
+    Rows are deduplicated by timestamp (later data wins) and kept sorted in
+    monthly partitions of one .npy file per column. ``query`` memory-maps only
+    the partitions overlapping the requested range, so opening the store is
+    instant and memory use follows the slice that is read.
+
+    Args:
+        root: Store directory (created on the first append)
+    """
+    def __init__(self, root):
+        self.root = root
+        manifest_path = os.path.join(root, MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {'columns': list(COLUMNS), 'partitions': {}}
+
+    @property
+    def partitions(self):
+        """Partition names in time order."""
+        return sorted(self.manifest['partitions'])
+
+    def __len__(self):
+        return sum(p['rows'] for p in self.manifest['partitions'].values())
+
+    @property
+    def time_range(self):
+        """(first, last) timestamp in the store, or None if it is empty."""
+        if not self.manifest['partitions']:
+            return None
+        parts = self.partitions
+        return (np.datetime64(self.manifest['partitions'][parts[0]]['start']),
+                np.datetime64(self.manifest['partitions'][parts[-1]]['end']))
+
+    def _load_partition(self, name, columns, mmap_mode='r'):
+        path = os.path.join(self.root, name)
+        return {column: np.load(os.path.join(path, column + '.npy'), mmap_mode=mmap_mode)
+                for column in columns}
+
+    def append(self, data):
+        """
+        Add rows, replacing existing rows with the same timestamp.
+
+        Args:
+            data: dict with 'time' and any of COLUMNS (missing columns become NaN)
+
+        Returns:
+            int: Number of rows in the store afterwards
+        """
+        time = np.asarray(data[TIME_COLUMN], dtype='datetime64[s]')
+        columns = {name: np.asarray(data[name], dtype=np.float64) if name in data else np.full(len(time), np.nan)
+                   for name in COLUMNS}
+        keep = _keep_last(time)
+        time = time[keep]
+        columns = {name: values[keep] for name, values in columns.items()}
+
+        months = time.astype('datetime64[M]')
+        bounds = np.flatnonzero(np.diff(months.astype(np.int64))) + 1
+        for part in np.split(np.arange(len(time)), bounds):
+            if len(part) == 0:
+                continue
+            name = str(months[part[0]])
+            part_time = time[part]
+            part_columns = {column: values[part] for column, values in columns.items()}
+            if name in self.manifest['partitions']:
+                # Merge with the stored month; the new rows win on equal timestamps
+                old = self._load_partition(name, (TIME_COLUMN,) + COLUMNS, mmap_mode=None)
+                merged_time = np.concatenate([old[TIME_COLUMN], part_time])
+                keep = _keep_last(merged_time)
+                part_time = merged_time[keep]
+                part_columns = {column: np.concatenate([old[column], values])[keep]
+                                for column, values in part_columns.items()}
+
+            path = os.path.join(self.root, name)
+            os.makedirs(path, exist_ok=True)
+            _save(os.path.join(path, TIME_COLUMN + '.npy'), part_time)
+            for column, values in part_columns.items():
+                _save(os.path.join(path, column + '.npy'), values)
+            self.manifest['partitions'][name] = {
+                'start': str(part_time[0]), 'end': str(part_time[-1]), 'rows': len(part_time),
+            }
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, MANIFEST + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+        return len(self)
+
+    def ingest_csv(self, filepaths):
+        """Append CSV files in order, so later files win on overlapping hours."""
+        if isinstance(filepaths, str):
+            filepaths = [filepaths]
+        for filepath in filepaths:
+            self.append(read_weather_csv(filepath))
+        return len(self)
+
+    def query(self, start=None, end=None, columns=None):
+        """
+        Rows with ``start <= time < end``.
+
+        Within one partition the arrays are read-only memory-mapped views;
+        ranges spanning several months are concatenated, which copies only the
+        selected rows.
+
+        Args:
+            start, end: Anything np.datetime64 accepts (e.g. '2025-03-09T06:00'), or None for open ends
+            columns: Column names to return (all of COLUMNS by default)
+
+        Returns:
+            dict: 'time' plus the requested columns
+        """
+        columns = list(COLUMNS if columns is None else columns)
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise KeyError(f"Unknown columns: {sorted(unknown)}")
+        start = None if start is None else np.datetime64(start, 's')
+        end = None if end is None else np.datetime64(end, 's')
+
+        pieces = []
+        for name in self.partitions:
+            info = self.manifest['partitions'][name]
+            if end is not None and np.datetime64(info['start']) >= end:
+                continue
+            if start is not None and np.datetime64(info['end']) < start:
+                continue
+            part = self._load_partition(name, [TIME_COLUMN] + columns)
+            time = part[TIME_COLUMN]
+            lo = 0 if start is None else np.searchsorted(time, start, side='left')
+            hi = len(time) if end is None else np.searchsorted(time, end, side='left')
+            pieces.append({column: values[lo:hi] for column, values in part.items()})
+
+        if len(pieces) == 1:
+            return pieces[0]
+        result = {TIME_COLUMN: np.empty(0, dtype='datetime64[s]')}
+        result.update({column: np.empty(0) for column in columns})
+        if pieces:
+            result = {column: np.concatenate([piece[column] for piece in pieces]) for column in result}
+        return result
+
+    def to_frame(self, start=None, end=None, columns=None):
+        """Range query as a pandas DataFrame indexed by time."""
+        import pandas as pd
+
+        data = self.query(start, end, columns)
+        time = data.pop(TIME_COLUMN)
+        return pd.DataFrame({column: np.asarray(values) for column, values in data.items()},
+                            index=pd.DatetimeIndex(time, name=TIME_COLUMN))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect the columnar weather store")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="Append CSV files (later files win on duplicate hours)")
+    ingest.add_argument('store')
+    ingest.add_argument('files', nargs='+')
+
+    info = commands.add_parser('info', help="Show partitions and row counts")
+    info.add_argument('store')
+
+    query = commands.add_parser('query', help="Print rows in a time range as CSV")
+    query.add_argument('store')
+    query.add_argument('--start')
+    query.add_argument('--end')
+    query.add_argument('--columns', nargs='+')
+
+    args = parser.parse_args(argv)
+    store = WeatherStore(args.store)
+    if args.command == 'ingest':
+        rows = store.ingest_csv(args.files)
+        print(f"Ingested {len(args.files)} file(s) into {args.store}: {rows} rows")
+    elif args.command == 'info':
+        print(f"{args.store}: {len(store)} rows in {len(store.partitions)} partitions")
+        for name in store.partitions:
+            partition = store.manifest['partitions'][name]
+            print(f"  {name}: {partition['rows']} rows, {partition['start']} .. {partition['end']}")
+    else:
+        print(store.to_frame(args.start, args.end, args.columns).to_csv(), end='')
+
+
+if __name__ == '__main__':
+    main()
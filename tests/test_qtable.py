@@ -0,0 +1,67 @@
+import numpy as np
+
+from Utils.QTable import DenseQTable
+
+
+def test_insert_delete_cycles_reuse_rows():
+    table = DenseQTable(action_count=8, initial_rows=4)
+    for cycle in range(100):
+        keys = [(float(cycle), float(i)) for i in range(3)]
+        for key in keys:
+            table.set_q(key, 1, 0.5)
+            table.set_q(key, 2, 1.5)
+        for key in keys:
+            table.delete_q(key, 1)
+            table.delete_q(key, 2)
+        assert len(table) == 0
+
+    # Every cycle reused the three released rows instead of growing the table
+    assert table.n_rows == 3
+    assert len(table.values) == 4
+
+
+def test_released_row_is_clean_for_a_new_state():
+    table = DenseQTable(action_count=4)
+    table.set_q(('a',), 0, 1.0)
+    table.set_q(('a',), 3, 2.0)
+    table.delete_q(('a',), 0)
+    table.delete_q(('a',), 3)
+    table.set_q(('b',), 1, 5.0)
+
+    assert ('a',) not in table
+    assert table.row(('a',)) == {}
+    assert table.row(('b',)) == {1: 5.0}
+    assert table.argmax(('b',)) == 1
+    assert table.n_rows == 1
+
+
+def test_snapshot_keeps_only_live_rows():
+    table = DenseQTable(action_count=4)
+    for i in range(5):
+        table.set_q((float(i),), i % 4, float(i))
+    table.delete_q((1.0,), 1)
+    table.delete_q((3.0,), 3)
+
+    copy = table.snapshot()
+    assert copy.n_rows == 3
+    assert sorted(copy.keys()) == [(0.0,), (2.0,), (4.0,)]
+    assert copy.get_q((4.0,), 0) == 4.0
+    np.testing.assert_array_equal(copy.key_array().ravel(), [0.0, 2.0, 4.0])
+
+
+def test_set_row_replaces_and_removes_entries():
+    table = DenseQTable(action_count=4)
+    table.set_q(('a',), 0, 1.0)
+    table.set_q(('a',), 1, 2.0)
+
+    table.set_row(('a',), {2: 3.0})
+    assert table.row(('a',)) == {2: 3.0}
+    assert len(table) == 1
+
+    table.set_row(('a',), {})
+    assert ('a',) not in table
+    assert len(table) == 0
+
+    table.set_row(('b',), {3: 4.0})
+    assert table.n_rows == 1
+    assert table.row(('b',)) == {3: 4.0}